@@ -0,0 +1,47 @@
+"""
+Viewlet argument binding, against the previous dict based implementation.
+"""
+from utils import compare, setup
+
+
+def legacy_build_args(self, *args, **kwargs):
+    viewlet_func_kwargs = {
+        self.viewlet_func_args[i]: args[i] for i in range(0, len(args))
+    }
+    viewlet_func_kwargs.update(
+        {k: kwargs[k] for k in kwargs if k in self.viewlet_func_args}
+    )
+    return [viewlet_func_kwargs.get(arg) for arg in self.viewlet_func_args]
+
+
+def main():
+    setup()
+    from viewlet import get, viewlet
+
+    @viewlet
+    def no_args(context):
+        return ""
+
+    @viewlet
+    def many_args(context, a, b, c, d, e):
+        return ""
+
+    v0, v5 = get("no_args"), get("many_args")
+    context = {}
+    cases = [
+        ("context only", v0, (context,), {}),
+        ("all positional", v5, (context, 1, 2, 3, 4, 5), {}),
+        ("partial positional", v5, (context, 1, 2), {}),
+        ("kwargs", v5, (context,), {"a": 1, "c": 3, "e": 5, "x": 0}),
+    ]
+    for label, v, args, kwargs in cases:
+        assert legacy_build_args(v, *args, **kwargs) == v._build_args(*args, **kwargs)
+        compare(
+            label,
+            lambda: legacy_build_args(v, *args, **kwargs),
+            lambda: v._build_args(*args, **kwargs),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Viewlet cache key construction, against unmemoized keys validating the key format
+on every call, and sha1 against blake2b argument digests.
+"""
+from copy import copy
+
+from utils import bench, compare, setup
+
+
+def main():
+    setup(VIEWLET_VERSION_CHECK_INTERVAL=3600)
+    from viewlet import get, viewlet
+    from viewlet.cache import make_key_args_digest, make_key_args_hash
+
+    @viewlet(key="product:{args}")
+    def product(context, product_id, lang):
+        return ""
+
+    v = get("product")
+    args = (4711, "sv")
+
+    # Previous behaviour, validating the key format and building the key every call
+    legacy = copy(v)
+    legacy.key_format = legacy._cached_make_key = None
+
+    compare(
+        "memoized key",
+        lambda: legacy._build_cache_key(*args),
+        lambda: v._build_cache_key(*args),
+    )
+    bench("sha1 digest key", lambda: make_key_args_digest(v, args))
+    bench("blake2b digest key", lambda: make_key_args_hash(v, args))
+
+
+if __name__ == "__main__":
+    main()
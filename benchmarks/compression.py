@@ -0,0 +1,45 @@
+"""
+Cached fragment sizes and cache hit times, uncompressed against zlib and lzma compression.
+"""
+from utils import bench, setup
+
+SIZES = [16 * 1024, 128 * 1024, 512 * 1024]
+
+ROW = (
+    '<li class="product" data-id="%d"><a href="/products/%d/">Product %d</a>'
+    '<span class="price">%d.00 kr</span></li>\n'
+)
+
+
+def main():
+    setup()
+    from viewlet import compression, get, viewlet
+    from viewlet.models import settings
+
+    fragments = {}
+
+    @viewlet(timeout=None)
+    def fragment(context, size):
+        return fragments[size]
+
+    v = get("fragment")
+    settings.VIEWLET_COMPRESS_MIN_SIZE = 1024
+    for size in SIZES:
+        html = "".join(ROW % (i, i, i, i * 7 % 1000) for i in range(size // 80))
+        fragments[size] = "<ul>\n%s</ul>" % html[:size]
+        for compressor in (None, "zlib", "lzma"):
+            settings.VIEWLET_COMPRESSOR = compressor
+            compression.metrics.reset()
+            v.refresh(size)
+            stored = len(v.cache.get(v._build_cache_key(size)))
+            label = "%dKB %s" % (size // 1024, compressor or "uncompressed")
+            bench(label, lambda: v.call({}, size), number=200)
+            stats = compression.metrics.stats()
+            print(
+                "%-48s %10d bytes, compressed in %.3f ms"
+                % ("", stored, stats["compress_time"] * 1000)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Jinja2 template lookups through a loader per template directory against one template index,
+and cold template compilation with and without a bytecode cache.
+"""
+import os
+import tempfile
+
+from utils import bench, compare, setup
+
+APPS = [
+    "django.contrib.admin",
+    "django.contrib.admindocs",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.flatpages",
+    "django.contrib.humanize",
+    "django.contrib.messages",
+    "django.contrib.redirects",
+    "django.contrib.sessions",
+    "django.contrib.sitemaps",
+    "django.contrib.sites",
+    "django.contrib.staticfiles",
+    "django.contrib.syndication",
+    "viewlet",
+]
+
+BLOCK = """
+{%% macro product_%(i)d(product) %%}
+  <li class="{{ 'sale' if product.on_sale else 'regular' }}">
+    <a href="/products/{{ product.id }}/">{{ product.name|title }}</a>
+    {%% for image in product.images %%}<img src="{{ image.url }}" width="{{ image.width }}">{%% endfor %%}
+    {%% if product.price > 100 %%}<span>{{ "%%.2f"|format(product.price) }}</span>{%% endif %%}
+  </li>
+{%% endmacro %%}
+"""
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        with open(os.path.join(path, "page.html"), "w") as f:
+            f.write("".join(BLOCK % {"i": i} for i in range(50)))
+        setup(INSTALLED_APPS=APPS, TEMPLATE_DIRS=[path])
+
+        from jinja2 import (
+            ChoiceLoader,
+            Environment,
+            FileSystemBytecodeCache,
+            FileSystemLoader,
+        )
+
+        from viewlet.loaders.jinja2_loader import TemplateIndexLoader, get_template_dirs
+
+        dirs = get_template_dirs()
+        choice = ChoiceLoader([FileSystemLoader(d) for d in dirs])
+        index = TemplateIndexLoader(dirs)
+        env = Environment()
+        index.get_index()
+
+        def miss(loader):
+            try:
+                loader.get_source(env, "missing/template.html")
+            except Exception:
+                pass
+
+        print("%d template directories" % len(dirs))
+        compare("lookup miss", lambda: miss(choice), lambda: miss(index), number=5000)
+
+        bytecode_cache = FileSystemBytecodeCache(os.path.join(path, "bytecode"))
+        os.mkdir(bytecode_cache.directory)
+        Environment(loader=index, bytecode_cache=bytecode_cache).get_template(
+            "page.html"
+        )
+        bench(
+            "cold compile",
+            lambda: Environment(loader=index).get_template("page.html"),
+            number=20,
+        )
+        bench(
+            "cold compile, bytecode cache",
+            lambda: Environment(
+                loader=index, bytecode_cache=bytecode_cache
+            ).get_template("page.html"),
+            number=20,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Rendering a template viewlet in a deep context, flattening the context and copying it
+with the viewlet output merged in, against layering the output on top of the context.
+With a request, templates copy the context anyway, so both copy it, once.
+"""
+from utils import compare, setup
+
+
+def main():
+    setup()
+    from django.template import Context
+    from django.test import RequestFactory
+
+    from viewlet import get, viewlet
+    from viewlet.context import LayeredContext
+
+    @viewlet(template="hello_world.html", timeout=None)
+    def hello(context, name):
+        return {"name": name}
+
+    v = get("hello")
+    output = {"name": "world"}
+
+    # 10 layers of 50 keys, like nested includes and loops of a real page
+    context = Context()
+    for layer in range(10):
+        context.push({"var_%d_%d" % (layer, i): i for i in range(50)})
+
+    for label, request in (("", None), (" with request", RequestFactory().get("/"))):
+
+        def render_before():
+            flat = dict(context.flatten())
+            flat.update(output)
+            return v.render(flat, request=request)
+
+        def render_after():
+            layered = LayeredContext.from_context(context)
+            return v._render_output(layered, output, request=request)
+
+        assert render_before() == render_after()
+        compare("template viewlet" + label, render_before, render_after, number=5000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Stored sizes and cache round trips of a context dict, pickled by the cache backend
+against the viewlet serializers.
+"""
+import pickle
+
+from utils import bench, setup
+
+
+def make_context():
+    return {
+        "title": "Bestsellers",
+        "page": 1,
+        "products": [
+            {
+                "id": i,
+                "name": "Product %d" % i,
+                "slug": "product-%d" % i,
+                "price": i * 7 % 1000 + 0.95,
+                "in_stock": i % 3 != 0,
+                "tags": ["tag-%d" % (i % 5), "tag-%d" % (i % 7)],
+                "images": [
+                    {"url": "/media/products/%d/%d.jpg" % (i, n), "width": 640}
+                    for n in range(3)
+                ],
+            }
+            for i in range(100)
+        ],
+    }
+
+
+def main():
+    setup()
+    from viewlet import get, viewlet
+    from viewlet.models import settings
+
+    context = make_context()
+
+    @viewlet(timeout=None)
+    def products(context):
+        return context
+
+    v = get("products")
+    key = v._build_cache_key()
+    for serializer in (None, "pickle", "json", "marshal"):
+        settings.VIEWLET_SERIALIZER = serializer
+        entry = v._encode_entry(context)
+        # Backends pickle entries, LocMemCache at the highest protocol
+        size = len(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+
+        def round_trip():
+            v._cache_set(key, context)
+            return v._cache_get(key)
+
+        assert round_trip() == context
+        bench(
+            "%s (%d bytes)" % (serializer or "backend", size), round_trip, number=2000
+        )
+
+
+if __name__ == "__main__":
+    main()
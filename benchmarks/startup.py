@@ -0,0 +1,98 @@
+"""
+Time to first viewlet lookup in a fresh process, scanning the views of all apps
+against importing only the viewlet module listed in a manifest.
+Apps are generated with views importing a share of the standard library, like real views do.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from utils import ROOT
+
+APPS = 20
+
+HEAVY_IMPORTS = [
+    "asyncio",
+    "csv",
+    "decimal",
+    "email.mime.multipart",
+    "ftplib",
+    "http.server",
+    "logging.handlers",
+    "multiprocessing",
+    "smtplib",
+    "sqlite3",
+    "statistics",
+    "tarfile",
+    "unittest",
+    "urllib.request",
+    "xml.dom.minidom",
+    "xml.etree.ElementTree",
+    "zipfile",
+    "pydoc",
+    "difflib",
+    "argparse",
+]
+
+VIEWS = """\
+import %(module)s  # NOQA
+
+from viewlet import viewlet
+
+
+@viewlet(timeout=0)
+def viewlet_%(index)d(context):
+    return "Hello %(index)d"
+"""
+
+CHILD = """\
+import sys
+import time
+
+import django
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=["viewlet"] + ["app_%%d" %% i for i in range(%(apps)d)],
+    VIEWLET_MANIFEST=%(manifest)r,
+)
+django.setup()
+import viewlet
+
+start = time.perf_counter()
+viewlet.get("viewlet_%(index)d")
+print(time.perf_counter() - start, len(sys.modules))
+"""
+
+
+def run(path, manifest):
+    code = CHILD % {"apps": APPS, "manifest": manifest, "index": APPS // 2}
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([path, ROOT]))
+    output = subprocess.check_output([sys.executable, "-c", code], env=env)
+    seconds, modules = output.split()
+    return float(seconds), int(modules)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        manifest = {}
+        for i in range(APPS):
+            app = os.path.join(path, "app_%d" % i)
+            os.mkdir(app)
+            open(os.path.join(app, "__init__.py"), "w").close()
+            with open(os.path.join(app, "views.py"), "w") as f:
+                f.write(VIEWS % {"module": HEAVY_IMPORTS[i], "index": i})
+            manifest["viewlet_%d" % i] = "app_%d.views" % i
+        manifest_path = os.path.join(path, "viewlets.json")
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+
+        for label, setting in (("autodiscover", None), ("manifest", manifest_path)):
+            seconds, modules = min(run(path, setting) for _ in range(5))
+            print("%-48s %10.3f ms, %d modules" % (label, seconds * 1000, modules))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Cache hits of rendered fragments stored as utf-8 bytes, against strings stored as is,
+with the LocMemCache backend pickling entries like most remote backends do.
+"""
+from utils import bench, setup
+
+SIZES = [1024, 16 * 1024, 128 * 1024, 1024 * 1024]
+
+
+def main():
+    setup()
+    from django.utils.safestring import mark_safe
+
+    from viewlet import get, viewlet
+    from viewlet.models import settings
+
+    fragments = {}
+
+    @viewlet(timeout=None)
+    def fragment(context, size):
+        return fragments[size]
+
+    v = get("fragment")
+    for size in SIZES:
+        fragments[size] = mark_safe(("<p>wörld</p>" * size)[:size])
+        results = []
+        for storage in ("bytes", "str"):
+            settings.VIEWLET_STRING_STORAGE = storage
+            v.refresh(size)
+            results.append(
+                bench(
+                    "%dKB %s" % (size // 1024, storage),
+                    lambda: mark_safe(v.call({}, size)),
+                    number=max(10, 10000 * 1024 // size),
+                )
+            )
+        print("%-48s %10.2fx" % ("%dKB" % (size // 1024), results[0] / results[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Rendering the viewlet tag in a deep context stack, looking the viewlet up and flattening
+the context on every render, against the viewlet resolved once and a layered context view.
+"""
+from utils import compare, setup
+
+
+def main():
+    setup(VIEWLET_TEMPLATE_PREFETCH=False)
+    from django.template import Context, engines
+
+    from viewlet import get, viewlet
+    from viewlet.templatetags import viewlets
+
+    @viewlet(timeout=None)
+    def greeting(context, name):
+        return "Hello %s!" % name
+
+    get("greeting").call({}, "world")
+
+    # 10 layers of 50 keys, like nested includes and loops of a real page
+    context = Context()
+    for layer in range(10):
+        context.push({"var_%d_%d" % (layer, i): i for i in range(50)})
+    context["name"] = "world"
+
+    template = engines["django"].from_string(
+        "{% load viewlets %}" + "{% viewlet greeting name %}" * 10
+    )
+    template = template.template
+
+    class FlatContext:
+        @staticmethod
+        def from_context(context):
+            return context.flatten()
+
+    def get_viewlet(node):
+        return viewlets.viewlet.get(node.viewlet_name)
+
+    def render_before():
+        layered, resolve = viewlets.LayeredContext, viewlets.ViewletNode.get_viewlet
+        viewlets.LayeredContext, viewlets.ViewletNode.get_viewlet = (
+            FlatContext,
+            get_viewlet,
+        )
+        try:
+            return template.render(context)
+        finally:
+            viewlets.LayeredContext, viewlets.ViewletNode.get_viewlet = layered, resolve
+
+    def render_after():
+        return template.render(context)
+
+    assert render_before() == render_after()
+    compare("10 viewlet tags", render_before, render_after, number=2000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Shared setup for the benchmark scripts, run from the repository root, i.e.:
+
+    $ python benchmarks/build_args.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def setup(**settings):
+    import django
+    from django.conf import settings as django_settings
+
+    conf = {
+        "INSTALLED_APPS": [
+            "django.contrib.auth",
+            "django.contrib.contenttypes",
+            "viewlet",
+        ],
+        "SECRET_KEY": "benchmark",
+        "DATABASES": {
+            "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+        },
+        "CACHES": {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        },
+        "TEMPLATES": [
+            {
+                "BACKEND": "django.template.backends.django.DjangoTemplates",
+                "APP_DIRS": True,
+                "DIRS": [
+                    os.path.join(ROOT, "viewlet", "tests", "template_dir"),
+                    os.path.join(ROOT, "viewlet", "tests", "templates"),
+                ],
+            }
+        ],
+    }
+    conf.update(settings)
+    django_settings.configure(**conf)
+    django.setup()
+
+
+def bench(label, func, number=100000, repeat=5):
+    """
+    Prints the best time per call, in microseconds, of a number of calls.
+    """
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    usec = best / number * 1e6
+    print("%-48s %10.3f us" % (label, usec))
+    return usec
+
+
+def compare(label, before, after, **kwargs):
+    """
+    Benchmarks a before and after function, printing the speedup.
+    """
+    before = bench("%s (before)" % label, before, **kwargs)
+    after = bench("%s (after)" % label, after, **kwargs)
+    print("%-48s %10.2fx" % (label, before / after))
@@ -1,4 +1,15 @@
-from .api import call, get, refresh, viewlet  # NOQA
+from .api import (  # NOQA
+    acall,
+    aprefetch,
+    call,
+    call_many,
+    flush,
+    get,
+    invalidate_tags,
+    prefetch,
+    refresh,
+    viewlet,
+)
 
 VERSION = (1, 5, 1, "final", 0)
 
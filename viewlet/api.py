@@ -1,6 +1,17 @@
 from viewlet.library import library
 
-__all__ = ["viewlet", "get", "call", "refresh"]
+__all__ = [
+    "viewlet",
+    "get",
+    "call",
+    "acall",
+    "call_many",
+    "refresh",
+    "invalidate_tags",
+    "flush",
+    "prefetch",
+    "aprefetch",
+]
 
 
 # The decorator
@@ -15,5 +26,83 @@ def call(viewlet_name, context, *args, **kwargs):
     return get(viewlet_name).call(context or {}, *args, **kwargs)
 
 
+async def acall(viewlet_name, context, *args, **kwargs):
+    return await get(viewlet_name).acall(context or {}, *args, **kwargs)
+
+
+def call_many(calls, context=None, request=None):
+    """
+    Renders many (name, args, kwargs) viewlet calls with one cache round trip,
+    computing cache misses concurrently. Returns the outputs in call order.
+    """
+    from viewlet.cache import prefetched
+    from viewlet.context import LayeredContext
+    from viewlet.models import compute_many, get_many
+
+    context = context or {}
+    viewlets = [(get(name), args, kwargs) for name, args, kwargs in calls]
+    # Viewlets get a context layer of their own, keeping their writes apart
+    merged = [
+        (v, v._build_args(LayeredContext(context), *args, **kwargs))
+        for v, args, kwargs in viewlets
+    ]
+    entries = compute_many(merged, get_many(merged), request=request)
+    with prefetched(entries):
+        return [
+            v.call(LayeredContext(context), *args, **dict(kwargs, request=request))
+            for v, args, kwargs in viewlets
+        ]
+
+
 def refresh(name, *args, **kwargs):
     return get(name).refresh(*args, **kwargs)
+
+
+def invalidate_tags(*tags):
+    from viewlet.cache import invalidate_tags
+
+    invalidate_tags(*tags)
+
+
+def flush(*names):
+    """
+    Flushes all cached viewlets, or named viewlets only, without clearing the cache.
+    """
+    if names:
+        for name in names:
+            get(name).flush()
+    else:
+        from viewlet.cache import flush_versions
+
+        flush_versions()
+        for v in library.values():
+            v._version = (0, None)
+
+
+def prefetch(*calls):
+    """
+    Context manager fetching the cached output of many (name, args, kwargs) viewlet
+    calls in one cache round trip, for the calls made within it to render from.
+    """
+    from viewlet.cache import prefetched
+    from viewlet.models import get_many
+
+    viewlets = ((get(name), args, kwargs) for name, args, kwargs in calls)
+    entries = get_many(
+        (v, v._build_args({}, *args, **kwargs)) for v, args, kwargs in viewlets
+    )
+    return prefetched(entries)
+
+
+async def aprefetch(*calls):
+    """
+    Async version of prefetch(), returning the context manager to render within.
+    """
+    from viewlet.cache import prefetched
+    from viewlet.models import aget_many
+
+    viewlets = ((get(name), args, kwargs) for name, args, kwargs in calls)
+    entries = await aget_many(
+        [(v, v._build_args({}, *args, **kwargs)) for v, args, kwargs in viewlets]
+    )
+    return prefetched(entries)
@@ -1,8 +1,16 @@
 import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import time
+from uuid import uuid4
 
 from django.utils.encoding import smart_str
 
 from .conf import settings
+from .const import MISSING
 from .exceptions import DeprecatedKeyFormat, WrongKeyFormat
 
 
@@ -18,6 +26,144 @@ def get_cache(alias=None):
     return c
 
 
+_prefetched = ContextVar("viewlet_prefetched", default=None)
+_memo = ContextVar("viewlet_memo", default=None)
+
+
+@contextmanager
+def prefetched(entries):
+    """
+    Makes prefetched raw cache entries available to viewlet calls within the scope.
+    A missing entry should be present with a None value to avoid fetching it again.
+    """
+    outer = _prefetched.get()
+    if outer:
+        entries = {**outer, **entries}
+    token = _prefetched.set(entries)
+    try:
+        yield entries
+    finally:
+        _prefetched.reset(token)
+
+
+@contextmanager
+def memoize():
+    """
+    Memoizes raw cache entries for the scope, usually a request,
+    so that repeated viewlet calls hit the cache backend once.
+    """
+    token = _memo.set({})
+    try:
+        yield
+    finally:
+        _memo.reset(token)
+
+
+def local_get(key):
+    """
+    Returns a prefetched or memoized raw cache entry, or MISSING.
+    """
+    for entries in (_prefetched.get(), _memo.get()):
+        if entries is not None and key in entries:
+            return entries[key]
+    return MISSING
+
+
+def local_set(key, value):
+    """
+    Updates prefetched and memoized raw cache entries, None meaning expired.
+    """
+    prefetched = _prefetched.get()
+    if prefetched is not None and key in prefetched:
+        prefetched[key] = value
+
+    memo = _memo.get()
+    if memo is not None:
+        if value is None:
+            memo.pop(key, None)
+        else:
+            memo[key] = value
+
+
+class LocalCache:
+    """
+    Bounded, process local LRU cache of raw viewlet cache entries.
+    Entries expire after their timeout, or when their viewlet generation changes.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, entry_generation, size, value = entry
+                if expires > time() and entry_generation == generation:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._delete(key)
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value, timeout, generation):
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._delete(key)
+            self._entries[key] = (time() + timeout, generation, size, value)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._delete(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._delete(key)
+
+    def _delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+
+def sizeof(value):
+    """
+    Approximate size in bytes of a raw cache entry. Other entries than strings,
+    like context dicts, are measured pickled, including all they hold.
+    """
+    if isinstance(value, tuple):
+        return sum(sizeof(v) for v in value)
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+local_cache = LocalCache(
+    settings.VIEWLET_LOCAL_CACHE_MAX_ENTRIES, settings.VIEWLET_LOCAL_CACHE_MAX_BYTES
+)
+
+
 def join_args(args):
     return ":".join(map(smart_str, args))
 
@@ -26,14 +172,26 @@ def digest_args(args):
     return hashlib.sha1(join_args(args).encode("utf8")).hexdigest()
 
 
-def make_key_args_fmt(viewlet, args):
+def hash_args(args):
+    return hashlib.blake2b(join_args(args).encode("utf8"), digest_size=8).hexdigest()
+
+
+def get_key_format(viewlet):
+    """
+    Returns the key format of a viewlet, validating any custom key.
+    """
     if viewlet.key:
         if "%" in viewlet.key:
             raise DeprecatedKeyFormat
         if viewlet.has_args and "{args}" not in viewlet.key:
             raise WrongKeyFormat
 
-    fmt = viewlet.key or "viewlet:%s:{args}" % viewlet.name
+    return viewlet.key or "viewlet:%s:{args}" % viewlet.name
+
+
+def make_key_args_fmt(viewlet, args):
+    # Key format is validated once on register, invalid ones raise here
+    fmt = viewlet.key_format or get_key_format(viewlet)
     return fmt.format(args=args)
 
 
@@ -43,3 +201,134 @@ def make_key_args_join(viewlet, args):
 
 def make_key_args_digest(viewlet, args):
     return make_key_args_fmt(viewlet, digest_args(args))
+
+
+def make_key_args_hash(viewlet, args):
+    return make_key_args_fmt(viewlet, hash_args(args))
+
+
+def make_tag_key(tag):
+    return "viewlet:tag:%s" % tag
+
+
+def new_version():
+    return uuid4().hex
+
+
+def add_version(cache, key, version):
+    """
+    Stores a version missing in cache, returning the one stored concurrently if any.
+    """
+    if not cache.add(key, version, settings.VIEWLET_INFINITE_CACHE_TIMEOUT):
+        version = cache.get(key, version)
+    return version
+
+
+async def aadd_version(cache, key, version):
+    """
+    Async version of add_version().
+    """
+    if not await cache.aadd(key, version, settings.VIEWLET_INFINITE_CACHE_TIMEOUT):
+        version = await cache.aget(key, version)
+    return version
+
+
+def get_tag_versions(tags):
+    """
+    Returns the current version of each tag, from the default viewlet cache.
+    Tags without a version get a new one, so that entries tagged with a
+    version lost to eviction never become valid again.
+    """
+    cache = get_cache()
+    keys = [make_tag_key(tag) for tag in tags]
+    versions = {key: local_get(key) for key in keys}
+    missing = [key for key, version in versions.items() if version in (None, MISSING)]
+
+    if missing:
+        found = cache.get_many(missing)
+        for key in missing:
+            version = found.get(key)
+            if version is None:
+                version = add_version(cache, key, new_version())
+            versions[key] = version
+            local_set(key, version)
+
+    return [versions[key] for key in keys]
+
+
+async def aget_tag_versions(tags):
+    """
+    Async version of get_tag_versions().
+    """
+    cache = get_cache()
+    keys = [make_tag_key(tag) for tag in tags]
+    versions = {key: local_get(key) for key in keys}
+    missing = [key for key, version in versions.items() if version in (None, MISSING)]
+
+    if missing:
+        found = await cache.aget_many(missing)
+        for key in missing:
+            version = found.get(key)
+            if version is None:
+                version = await aadd_version(cache, key, new_version())
+            versions[key] = version
+            local_set(key, version)
+
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    """
+    Invalidates all viewlets tagged with any of given tags, by changing tag versions.
+    """
+    keys = [make_tag_key(tag) for tag in tags]
+    get_cache().set_many(
+        {key: new_version() for key in keys}, settings.VIEWLET_INFINITE_CACHE_TIMEOUT
+    )
+    for key in keys:
+        local_set(key, None)
+
+
+NAMESPACE_VERSION_KEY = "viewlet:version"
+
+
+def make_version_key(name):
+    return "viewlet:version:%s" % name
+
+
+def get_versions(name):
+    """
+    Returns the global namespace version and version of named viewlet, from the
+    default viewlet cache. Versions missing, never flushed or evicted, get a new one,
+    so that entries of a version lost to eviction never become valid again.
+    """
+    cache = get_cache()
+    keys = [NAMESPACE_VERSION_KEY, make_version_key(name)]
+    found = cache.get_many(keys)
+    return [
+        found.get(key) or add_version(cache, key, new_version()[:12]) for key in keys
+    ]
+
+
+async def aget_versions(name):
+    """
+    Async version of get_versions().
+    """
+    cache = get_cache()
+    keys = [NAMESPACE_VERSION_KEY, make_version_key(name)]
+    found = await cache.aget_many(keys)
+    return [
+        found.get(key) or await aadd_version(cache, key, new_version()[:12])
+        for key in keys
+    ]
+
+
+def flush_versions(*names):
+    """
+    Flushes named viewlets, or all viewlets if no names given, by changing versions.
+    """
+    keys = [make_version_key(name) for name in names] or [NAMESPACE_VERSION_KEY]
+    get_cache().set_many(
+        {key: new_version()[:12] for key in keys},
+        settings.VIEWLET_INFINITE_CACHE_TIMEOUT,
+    )
@@ -0,0 +1,91 @@
+import lzma
+import threading
+import zlib
+from time import thread_time
+
+# Header bytes, never starting valid utf-8, telling compressed entries from encoded strings
+HEADERS = {
+    "zlib": b"\xf8",
+    "lzma": b"\xf9",
+}
+
+COMPRESSORS = {
+    "zlib": zlib.compress,
+    "lzma": lzma.compress,
+}
+
+DECOMPRESSORS = {
+    HEADERS["zlib"]: zlib.decompress,
+    HEADERS["lzma"]: lzma.decompress,
+}
+
+
+class CompressionMetrics:
+    """
+    Process wide counters of compressed sizes and CPU time spent (de)compressing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.compressed = 0
+            self.decompressed = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.compress_time = 0.0
+            self.decompress_time = 0.0
+
+    def record_compress(self, size, compressed_size, duration):
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += size
+            self.bytes_out += compressed_size
+            self.compress_time += duration
+
+    def record_decompress(self, duration):
+        with self._lock:
+            self.decompressed += 1
+            self.decompress_time += duration
+
+    def stats(self):
+        return {
+            "compressed": self.compressed,
+            "decompressed": self.decompressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.bytes_in / self.bytes_out if self.bytes_out else None,
+            "compress_time": self.compress_time,
+            "decompress_time": self.decompress_time,
+        }
+
+
+metrics = CompressionMetrics()
+
+
+def compress(data, compressor):
+    """
+    Compresses bytes with the named compressor, prefixed with its header byte.
+    Returns the data as is when compression does not make it smaller.
+    """
+    start = thread_time()
+    compressed = HEADERS[compressor] + COMPRESSORS[compressor](data)
+    metrics.record_compress(len(data), len(compressed), thread_time() - start)
+    if len(compressed) >= len(data):
+        return data
+    return compressed
+
+
+def decompress(data):
+    """
+    Decompresses bytes starting with a compressor header byte, otherwise returns them as is.
+    """
+    decompressor = DECOMPRESSORS.get(data[:1])
+    if decompressor is None:
+        return data
+    start = thread_time()
+    data = decompressor(data[1:])
+    metrics.record_decompress(thread_time() - start)
+    return data
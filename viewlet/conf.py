@@ -18,7 +18,32 @@ settings = ViewletSettings(
         "VIEWLET_DEFAULT_CACHE_ALIAS": "viewlet",
         "VIEWLET_CACHE_KEY_FUNCTION": "viewlet.cache.make_key_args_digest",
         "VIEWLET_CACHE_KEY_MAX_LENGTH": 255,
+        "VIEWLET_CACHE_KEY_LRU_SIZE": 1024,
         "VIEWLET_INFINITE_CACHE_TIMEOUT": 31104000,  # 60*60*24*30*12, about a year
+        "VIEWLET_CACHE_RENDERED": False,
+        "VIEWLET_STRING_STORAGE": "bytes",
+        "VIEWLET_SERIALIZER": None,
+        "VIEWLET_COMPRESSOR": None,
+        "VIEWLET_COMPRESS_MIN_SIZE": 16 * 1024,
+        "VIEWLET_CACHE_LOCK": False,
+        "VIEWLET_CACHE_LOCK_TIMEOUT": 30,
+        "VIEWLET_CACHE_LOCK_WAIT": 5,
+        "VIEWLET_CACHE_LOCK_POLL_INTERVAL": 0.05,
+        "VIEWLET_STALE_REFRESH_FUNCTION": "viewlet.executor.refresh_viewlet",
+        "VIEWLET_THREAD_POOL_SIZE": 4,
+        "VIEWLET_REQUEST_THREAD_POOL_SIZE": 4,
+        "VIEWLET_BATCH_MAX_CALLS": 20,
+        "VIEWLET_TEMPLATE_PREFETCH": True,
+        "VIEWLET_PARALLEL_RENDER": False,
+        "VIEWLET_LOCAL_CACHE_TIMEOUT": None,
+        "VIEWLET_LOCAL_CACHE_MAX_ENTRIES": 1000,
+        "VIEWLET_LOCAL_CACHE_MAX_BYTES": 16 * 1024 * 1024,
+        "VIEWLET_LOCAL_CACHE_GENERATION_INTERVAL": 1,
+        "VIEWLET_HTTP_MAX_AGE": None,
+        "VIEWLET_VERSION_CHECK_INTERVAL": 1,
+        "VIEWLET_MANIFEST": None,
         "VIEWLET_JINJA2_ENVIRONMENT": "viewlet.loaders.jinja2_loader.create_env",
+        "VIEWLET_JINJA2_BYTECODE_CACHE_DIR": None,
+        "VIEWLET_JINJA2_CACHE_SIZE": 400,
     }
 )
@@ -1 +1,2 @@
 DEFAULT_TIMEOUT = object()
+MISSING = object()
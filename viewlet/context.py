@@ -0,0 +1,168 @@
+import copy
+
+# Private key of the keys deleted from the layers, masking them
+MASKED = object()
+
+
+class LayeredContext(dict):
+    """
+    Dict looking keys up through layers of mappings, first layer first, without copying them.
+    Writes go to the dict itself, on top of the layers, leaving them untouched.
+    Deletes of keys in the layers are masked, kept in the dict itself under a private key,
+    which also keeps C code reading the dict storage, like json.dumps, from seeing it empty.
+    """
+
+    def __init__(self, *layers):
+        super().__init__()
+        dict.__setitem__(self, MASKED, frozenset())
+        self.layers = layers
+
+    @classmethod
+    def from_context(cls, context):
+        """
+        Returns a view of a template context, or the context itself if not layered.
+        """
+        if hasattr(context, "dicts"):
+            return cls(*reversed(context.dicts))
+        return context
+
+    def __missing__(self, key):
+        for layer in self.layers:
+            if key in layer:
+                if key in dict.__getitem__(self, MASKED):
+                    break
+                return layer[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        masked = dict.__getitem__(self, MASKED)
+        if key in masked:
+            dict.__setitem__(self, MASKED, masked - {key})
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if dict.__contains__(self, key):
+            dict.__delitem__(self, key)
+        if any(key in layer for layer in self.layers):
+            dict.__setitem__(self, MASKED, dict.__getitem__(self, MASKED) | {key})
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (
+            key not in dict.__getitem__(self, MASKED)
+            and any(key in layer for layer in self.layers)
+        )
+
+    def __iter__(self):
+        return iter(self.flatten())
+
+    def __len__(self):
+        return len(self.flatten())
+
+    def __bool__(self):
+        if dict.__len__(self) > 1:
+            return True
+        if dict.__getitem__(self, MASKED):
+            return bool(self.flatten())
+        return any(self.layers)
+
+    def __eq__(self, other):
+        return self.flatten() == other
+
+    __ne__ = object.__ne__
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.flatten())
+
+    def __or__(self, other):
+        flat = self.flatten()
+        flat.update(other)
+        return flat
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def popitem(self):
+        flat = self.flatten()
+        if not flat:
+            raise KeyError("popitem(): dictionary is empty")
+        key, value = flat.popitem()
+        del self[key]
+        return key, value
+
+    def clear(self):
+        masked = dict.__getitem__(self, MASKED).union(self.flatten())
+        dict.clear(self)
+        dict.__setitem__(self, MASKED, masked)
+
+    def keys(self):
+        return self.flatten().keys()
+
+    def values(self):
+        return self.flatten().values()
+
+    def items(self):
+        return self.flatten().items()
+
+    def copy(self):
+        return self.flatten()
+
+    # Pickled and copied as the plain dict it stands for, layers and masks included,
+    # as unpickling and copying a dict subclass sets items before __init__ has run
+
+    def __reduce__(self):
+        return (dict, (self.flatten(),))
+
+    def __copy__(self):
+        return self.flatten()
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.flatten(), memo)
+
+    def flatten(self):
+        """
+        Returns a plain dict of all keys, merging layers from the bottom up.
+        """
+        flat = {}
+        for layer in reversed(self.layers):
+            flat.update(layer.flatten() if isinstance(layer, LayeredContext) else layer)
+        for key in dict.__getitem__(self, MASKED):
+            flat.pop(key, None)
+        if dict.__len__(self) > 1:
+            # Left out instead of deleted after, as copies of dicts with deletes are slower
+            flat.update(item for item in dict.items(self) if item[0] is not MASKED)
+        return flat
+
+    def new_child(self, layer):
+        """
+        Returns a new context with the given layer on top of this one.
+        """
+        return self.__class__(layer, self)
@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from .conf import settings
+
+_executors = {}
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_executor(pool="background"):
+    """
+    Returns a bounded thread pool, shared by the process: "background" for viewlet work
+    outside of the request, like stale refreshes, "request" for work requests wait on.
+    Each pool has its own bound, so requests never queue behind background refreshes.
+    """
+    executor = _executors.get(pool)
+    if executor is None:
+        with _executor_lock:
+            executor = _executors.get(pool)
+            if executor is None:
+                if pool == "request":
+                    size = settings.VIEWLET_REQUEST_THREAD_POOL_SIZE
+                else:
+                    size = settings.VIEWLET_THREAD_POOL_SIZE
+                executor = _executors[pool] = ThreadPoolExecutor(
+                    max_workers=size, thread_name_prefix="viewlet-%s" % pool
+                )
+    return executor
+
+
+def run(func, *args, **kwargs):
+    # Worker threads outlive requests, so handle their database connections
+    # the same way Django does around a request.
+    _local.in_worker = True
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def in_worker():
+    """
+    Returns whether running in a worker thread, where waiting for
+    other workers could deadlock an exhausted pool.
+    """
+    return getattr(_local, "in_worker", False)
+
+
+def submit(func, *args, **kwargs):
+    """
+    Submits work a request waits on to the request pool.
+    """
+    return get_executor("request").submit(run, func, *args, **kwargs)
+
+
+def refresh_viewlet(viewlet, *args):
+    """
+    Default stale viewlet refresh, re-computing the viewlet in a background worker thread.
+    """
+    return get_executor().submit(run, viewlet.refresh, *args)
@@ -1,4 +1,7 @@
+import json
+import threading
 import types
+from importlib import import_module
 
 from .const import DEFAULT_TIMEOUT
 
@@ -23,13 +26,17 @@ class Library(dict):
 
     __metaclass__ = Singleton
 
+    def __init__(self):
+        super().__init__()
+        self.discovered = False
+        self._discover_lock = threading.RLock()
+        self._manifest = None
+
     def autodiscover(self):
         """
         Autodiscover decorated viewlets.
         Imports all views.py and viewlets.py to trigger the decorators.
         """
-        from importlib import import_module
-
         from django.conf import settings
 
         for app in settings.INSTALLED_APPS:
@@ -43,13 +50,32 @@ class Library(dict):
             except ImportError:
                 pass
 
+        self.discovered = True
+
     def get(self, name):
         """
         Getter for a registered viewlet.
-        If not found then scan for decorated viewlets.
+        If not found then import its module from the manifest,
+        or else scan for decorated viewlets, once.
         """
-        if name not in self.keys():
-            self.autodiscover()
+        try:
+            return self[name]
+        except KeyError:
+            pass
+
+        module = self.get_manifest().get(name)
+        if module is not None:
+            try:
+                import_module(module)
+            except ImportError:
+                pass  # Stale manifest, look the viewlet up by autodiscovery
+            if name in self:
+                return self[name]
+
+        if not self.discovered:
+            with self._discover_lock:
+                if not self.discovered:
+                    self.autodiscover()
 
         if name not in self:
             from .exceptions import UnknownViewlet
@@ -58,6 +84,21 @@ class Library(dict):
 
         return self[name]
 
+    def get_manifest(self):
+        """
+        Returns the VIEWLET_MANIFEST mapping of viewlet names to their module,
+        loaded from a JSON file when the setting is a path.
+        """
+        if self._manifest is None:
+            from .conf import settings
+
+            manifest = settings.VIEWLET_MANIFEST or {}
+            if isinstance(manifest, str):
+                with open(manifest) as f:
+                    manifest = json.load(f)
+            self._manifest = manifest
+        return self._manifest
+
     def add(self, viewlet):
         """
         Adds a registered viewlet to the Library dict
@@ -73,6 +114,13 @@ class Library(dict):
         timeout=DEFAULT_TIMEOUT,
         using=None,
         cached=True,
+        cache_rendered=None,
+        lock=None,
+        soft_timeout=None,
+        local_timeout=None,
+        tags=None,
+        depends_on=None,
+        warmup=None,
     ):
         """
         Handles both decorator pointer and caller (with or without arguments).
@@ -96,6 +144,13 @@ class Library(dict):
                 timeout=timeout,
                 using=using,
                 cached=cached,
+                cache_rendered=cache_rendered,
+                lock=lock,
+                soft_timeout=soft_timeout,
+                local_timeout=local_timeout,
+                tags=tags,
+                depends_on=depends_on,
+                warmup=warmup,
             )
             return viewlet.register
 
@@ -1,19 +1,41 @@
+import os
 from importlib import import_module
 
+from django.apps import apps
 from django.conf import settings as django_settings
-from jinja2 import ChoiceLoader, FileSystemLoader, PackageLoader, nodes
-from jinja2.environment import Environment
+from jinja2 import (
+    BaseLoader,
+    FileSystemBytecodeCache,
+    TemplateNotFound,
+    Undefined,
+    nodes,
+)
+from jinja2.environment import Environment, TemplateExpression
 from jinja2.ext import Extension
 from jinja2.filters import do_mark_safe
+from jinja2.loaders import split_template_path
 
 import viewlet
 
+from ..cache import prefetched
 from ..conf import settings
+from ..context import LayeredContext
+from ..exceptions import UnknownViewlet
+from ..models import compute_many, get_many
+
+# Tags whose body may not run, or run with other variables than the template top level
+SCOPED_TAGS = {"if", "for", "macro", "call", "filter", "with"}
 
 
 class ViewletExtension(Extension):
     tags = {"viewlet"}
 
+    def __init__(self, environment):
+        super().__init__(environment)
+        # Template name -> [(name, args, in_block), ...] viewlet call nodes to prefetch
+        self._prefetch_calls = {}
+        self._prefetch_expressions = {}
+
     def parse(self, parser):
         lineno = next(parser.stream).lineno
 
@@ -27,29 +49,215 @@ class ViewletExtension(Extension):
             else:
                 name = parser.parse_expression()
             first = False
-        context = nodes.ContextReference()
+        batch, index = self._record_call(parser, name, viewlet_args)
+        args = nodes.List(viewlet_args)
+        if batch is not None:
+            # Arguments evaluated ahead when prefetching are not evaluated again
+            args = nodes.CondExpr(
+                self.call_method(
+                    "_has_prefetched_arguments",
+                    [nodes.ContextReference(), nodes.Const(batch), nodes.Const(index)],
+                ),
+                self.call_method(
+                    "_pop_prefetched_arguments",
+                    [nodes.ContextReference(), nodes.Const(batch), nodes.Const(index)],
+                ),
+                args,
+            )
 
         return nodes.CallBlock(
             self.call_method(
-                "_call_viewlet", args=[name, context, nodes.List(viewlet_args)]
+                "_call_viewlet",
+                args=[name, nodes.ContextReference(), args, nodes.Const(batch)],
             ),
             [],
             [],
             [],
         ).set_lineno(lineno)
 
-    def _call_viewlet(self, name, context, viewlet_args, caller=None):
+    def _record_call(self, parser, name, viewlet_args):
+        """
+        Records top level viewlet calls of a named template, to prefetch them all
+        on first viewlet render. Returns the prefetch batch, the template name,
+        and the index of the call in the batch.
+        """
+        if parser.name is None or SCOPED_TAGS.intersection(parser._tag_stack):
+            return None, None
+
+        calls = getattr(parser, "_viewlet_calls", None)
+        if calls is None:
+            # (Re)compiling the template, forget previously recorded calls
+            calls = parser._viewlet_calls = []
+            self._prefetch_calls[parser.name] = calls
+            self._prefetch_expressions.pop(parser.name, None)
+        # Blocks may be overridden by an extending template, and never render
+        calls.append((name, viewlet_args, "block" in parser._tag_stack))
+        return parser.name, len(calls) - 1
+
+    def _get_prefetch_calls(self, batch):
+        """
+        Returns recorded viewlet calls of a template, parsing it again for them when
+        it was loaded from the bytecode cache, without being parsed in this process.
+        """
+        calls = self._prefetch_calls.get(batch)
+        if calls is None:
+            source, filename, _ = self.environment.loader.get_source(
+                self.environment, batch
+            )
+            self.environment.parse(source, batch, filename)
+            calls = self._prefetch_calls.get(batch, [])
+        return calls
+
+    def _get_prefetch_expressions(self, batch):
+        """
+        Returns an expression resolving [name, args] of each recorded viewlet call
+        of a template, and whether the call is inside a block.
+        """
+        expressions = self._prefetch_expressions.get(batch)
+        if expressions is None:
+            expressions = []
+            for name, args, in_block in self._get_prefetch_calls(batch):
+                call = nodes.List([name, nodes.List(args)])
+                body = [nodes.Assign(nodes.Name("result", "store"), call, lineno=1)]
+                template = self.environment.from_string(nodes.Template(body, lineno=1))
+                expression = TemplateExpression(template, undefined_to_none=False)
+                expressions.append((expression, in_block))
+            self._prefetch_expressions[batch] = expressions
+        return expressions
+
+    def _prefetch(self, batch, context):
+        """
+        Fetches cached output of all recorded viewlet calls of a template at once,
+        computing misses outside of blocks in parallel if enabled.
+        Returns the entries, and the evaluated arguments by call index.
+        """
+        entries, arguments = {}, {}
+        if batch is None or not settings.VIEWLET_TEMPLATE_PREFETCH:
+            return entries, arguments
+
+        try:
+            expressions = self._get_prefetch_expressions(batch)
+        except TemplateNotFound:
+            return entries, arguments
+
+        parallel = settings.VIEWLET_PARALLEL_RENDER
+        variables = context.get_all()
+        flat = variables if parallel else {}
+        calls, certain = [], []
+        for index, (expression, in_block) in enumerate(expressions):
+            try:
+                name, args = expression(**variables)
+            except Exception:
+                # Raised again when rendering the call itself, if it renders
+                continue
+            if any(isinstance(arg, Undefined) for arg in args):
+                continue
+            try:
+                v = viewlet.get(name)
+            except UnknownViewlet:
+                continue
+            arguments[index] = args
+            # Viewlets computed in parallel get a context layer of their own
+            calls.append((v, v._build_args(LayeredContext(flat), *args)))
+            if not in_block:
+                certain.append(calls[-1])
+        if len(calls) > 1:
+            entries = get_many(calls)
+            if parallel:
+                entries = compute_many(certain, entries)
+        return entries, arguments
+
+    def _get_prefetched(self, context, batch):
+        # Prefetched entries and arguments are kept on the jinja context, which is per render
+        cached = getattr(context, "_viewlet_prefetched", None)
+        if cached is None:
+            cached = context._viewlet_prefetched = {}
+        if batch not in cached:
+            cached[batch] = self._prefetch(batch, context)
+        return cached[batch]
+
+    def _has_prefetched_arguments(self, context, batch, index):
+        return index in self._get_prefetched(context, batch)[1]
+
+    def _pop_prefetched_arguments(self, context, batch, index):
+        # Popped, blocks rendered again evaluate their arguments again
+        return self._get_prefetched(context, batch)[1].pop(index)
+
+    def _call_viewlet(self, name, context, viewlet_args, batch=None, caller=None):
+        entries, _ = self._get_prefetched(context, batch)
         context = context.get_all()
-        return mark_safe(viewlet.call(name, context, *viewlet_args))
+        with prefetched(entries):
+            return mark_safe(viewlet.call(name, context, *viewlet_args))
+
+
+class TemplateIndexLoader(BaseLoader):
+    """
+    Loads templates from an index of template names to paths, built once from the
+    template directories, instead of probing every directory on each lookup.
+    Directories listed first take precedence, like with a ChoiceLoader.
+    """
+
+    def __init__(self, searchpath, encoding="utf-8"):
+        self.searchpath = list(searchpath)
+        self.encoding = encoding
+        self._index = None
+
+    def get_index(self):
+        if self._index is None:
+            index = {}
+            for directory in self.searchpath:
+                for dirpath, _, filenames in os.walk(directory, followlinks=True):
+                    for filename in filenames:
+                        path = os.path.join(dirpath, filename)
+                        name = os.path.relpath(path, directory).replace(
+                            os.path.sep, "/"
+                        )
+                        index.setdefault(name, path)
+            self._index = index
+        return self._index
+
+    def get_source(self, environment, template):
+        path = self.get_index().get("/".join(split_template_path(template)))
+        if path is None:
+            raise TemplateNotFound(template)
+        with open(path, encoding=self.encoding) as f:
+            source = f.read()
+        mtime = os.path.getmtime(path)
+
+        def uptodate():
+            try:
+                return os.path.getmtime(path) == mtime
+            except OSError:
+                return False
+
+        return source, path, uptodate
+
+    def list_templates(self):
+        return sorted(self.get_index())
+
+
+def get_template_dirs():
+    """
+    Returns TEMPLATE_DIRS followed by the templates directories of installed apps.
+    """
+    dirs = list(getattr(django_settings, "TEMPLATE_DIRS", ()))
+    dirs.extend(os.path.join(app.path, "templates") for app in apps.get_app_configs())
+    return [directory for directory in dirs if os.path.isdir(directory)]
 
 
 def create_env():
-    x = (
-        (FileSystemLoader, django_settings.TEMPLATE_DIRS),
-        (PackageLoader, django_settings.INSTALLED_APPS),
+    bytecode_cache = None
+    if settings.VIEWLET_JINJA2_BYTECODE_CACHE_DIR:
+        os.makedirs(settings.VIEWLET_JINJA2_BYTECODE_CACHE_DIR, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(
+            settings.VIEWLET_JINJA2_BYTECODE_CACHE_DIR
+        )
+    env = Environment(
+        loader=TemplateIndexLoader(get_template_dirs()),
+        extensions=[ViewletExtension],
+        bytecode_cache=bytecode_cache,
+        cache_size=settings.VIEWLET_JINJA2_CACHE_SIZE,
     )
-    loaders = [loader(p) for loader, places in x for p in places]
-    env = Environment(loader=ChoiceLoader(loaders), extensions=[ViewletExtension])
     return env
 
 
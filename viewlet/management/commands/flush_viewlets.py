@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+import viewlet
+
+
+class Command(BaseCommand):
+    help = "Flushes all cached viewlets, or named viewlets only, without clearing the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Viewlet names to flush")
+
+    def handle(self, *names, **options):
+        names = options["names"]
+        viewlet.flush(*names)
+        if names:
+            self.stdout.write("Flushed viewlets: %s" % ", ".join(names))
+        else:
+            self.stdout.write("Flushed all viewlets")
@@ -0,0 +1,25 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from viewlet.api import library
+
+
+class Command(BaseCommand):
+    help = "Writes a JSON manifest of all viewlets and their modules, for the VIEWLET_MANIFEST setting."
+
+    def add_arguments(self, parser):
+        parser.add_argument("-o", "--output", help="File to write, defaults to stdout")
+
+    def handle(self, *args, **options):
+        library.autodiscover()
+        manifest = {
+            name: viewlet.viewlet_func.__module__
+            for name, viewlet in sorted(library.items())
+        }
+        output = json.dumps(manifest, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from viewlet.api import library
+from viewlet.executor import run
+
+
+def iter_warmup(viewlet):
+    """
+    Yields args and kwargs for each argument set declared by the viewlet warmup generator.
+    """
+    for arguments in viewlet.warmup():
+        if isinstance(arguments, dict):
+            yield (), arguments
+        elif isinstance(arguments, (list, tuple)):
+            yield tuple(arguments), {}
+        else:
+            yield (arguments,), {}
+
+
+def warm(viewlet, args, kwargs):
+    start = time()
+    viewlet.refresh(*args, **kwargs)
+    return time() - start
+
+
+class Command(BaseCommand):
+    help = "Populates caches of all viewlets declaring a warmup generator, or named viewlets only."
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Viewlet names to warm")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of viewlets refreshed concurrently, defaults to 4",
+        )
+
+    def handle(self, *names, **options):
+        names = options["names"]
+        if names:
+            viewlets = [library.get(name) for name in names]
+        else:
+            library.autodiscover()
+            viewlets = sorted(library.values(), key=lambda v: v.name)
+        viewlets = [v for v in viewlets if v.warmup is not None]
+
+        failures = 0
+        with ThreadPoolExecutor(max_workers=max(options["workers"], 1)) as pool:
+            for viewlet in viewlets:
+                start = time()
+                futures = [
+                    pool.submit(run, warm, viewlet, args, kwargs)
+                    for args, kwargs in iter_warmup(viewlet)
+                ]
+                count, slowest = 0, 0.0
+                for future in as_completed(futures):
+                    try:
+                        slowest = max(slowest, future.result())
+                        count += 1
+                    except Exception as e:
+                        failures += 1
+                        self.stderr.write("%s: %r" % (viewlet.name, e))
+                self.stdout.write(
+                    "%s: warmed %d in %.3fs (slowest %.3fs)"
+                    % (viewlet.name, count, time() - start, slowest)
+                )
+
+        if failures:
+            raise CommandError("Failed to warm %d viewlet argument sets" % failures)
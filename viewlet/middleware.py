@@ -0,0 +1,36 @@
+import asyncio
+
+from .cache import memoize
+
+try:
+    from asgiref.sync import markcoroutinefunction
+except ImportError:  # pragma: no cover, asgiref < 3.6
+
+    def markcoroutinefunction(func):
+        func._is_coroutine = asyncio.coroutines._is_coroutine
+        return func
+
+
+class ViewletMemoMiddleware:
+    """
+    Memoizes viewlet cache entries for the duration of a request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with memoize():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with memoize():
+            return await self.get_response(request)
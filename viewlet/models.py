@@ -1,14 +1,52 @@
+import asyncio
 import inspect
 import warnings
+from contextvars import copy_context
+from functools import lru_cache
 from importlib import import_module
+from time import sleep, time
+from uuid import uuid4
 
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.template.backends.django import Template as DjangoTemplate
 from django.template.context import BaseContext
-from django.template.loader import render_to_string
+from django.template.loader import get_template, select_template
 from django.utils.encoding import smart_bytes, smart_str
 
-from .cache import get_cache
+from .cache import (
+    aget_tag_versions,
+    aget_versions,
+    digest_args,
+    flush_versions,
+    get_cache,
+    get_key_format,
+    get_tag_versions,
+    get_versions,
+    invalidate_tags,
+    local_cache,
+    local_get,
+    local_set,
+    make_key_args_digest,
+    make_key_args_fmt,
+    make_key_args_hash,
+    make_key_args_join,
+    make_tag_key,
+    prefetched,
+)
+from .compression import compress, decompress
 from .conf import settings
-from .const import DEFAULT_TIMEOUT
+from .const import DEFAULT_TIMEOUT, MISSING
+from .context import LayeredContext
+from .exceptions import ViewletException
+from .executor import in_worker, submit
+from .serializers import dumps, loads
+
+try:
+    from asgiref.sync import async_to_sync, sync_to_async
+except ImportError:  # pragma: no cover, Django < 3.0
+    async_to_sync = sync_to_async = None
 
 
 def import_by_path(path):
@@ -18,6 +56,163 @@ def import_by_path(path):
 
 default_key_func = import_by_path(settings.VIEWLET_CACHE_KEY_FUNCTION)
 
+# Argument types with stable string representations, safe to memoize keys for
+KEY_CACHE_TYPES = frozenset((str, int, float, bool, bytes, type(None)))
+
+# Built-in key functions, depending on arguments only, safe to memoize keys of.
+# Custom ones may fold in request state, like the active language.
+PURE_KEY_FUNCTIONS = (
+    make_key_args_fmt,
+    make_key_args_join,
+    make_key_args_digest,
+    make_key_args_hash,
+)
+
+
+def make_model_tag(model):
+    return "model:%s" % model._meta.label_lower
+
+
+def invalidate_model(sender, using=None, **kwargs):
+    # Invalidate once committed, or concurrent renders would cache the old rows again
+    tag = make_model_tag(sender)
+    transaction.on_commit(lambda: invalidate_tags(tag), using=using)
+
+
+def connect_model(model):
+    """
+    Invalidates viewlets depending on model whenever an instance is saved or deleted.
+    """
+    for signal in (post_save, post_delete):
+        signal.connect(
+            invalidate_model,
+            sender=model,
+            dispatch_uid="viewlet:%s" % make_model_tag(model),
+        )
+
+
+def get_calls_tags(calls):
+    tags = set()
+    for viewlet, merged_args in calls:
+        if viewlet.is_using_cache() and (viewlet.tags or viewlet.depends_on):
+            tags.update(viewlet.get_tags(*merged_args[1:]))
+    return list(tags)
+
+
+def get_tag_entries(calls):
+    """
+    Returns the tag versions of many (viewlet, merged_args) calls, fetched with
+    a single get_many, as raw entries to prefetch keyed by tag key.
+    """
+    tags = get_calls_tags(calls)
+    versions = get_tag_versions(tags) if tags else []
+    return {make_tag_key(tag): version for tag, version in zip(tags, versions)}
+
+
+async def aget_tag_entries(calls):
+    """
+    Async version of get_tag_entries().
+    """
+    tags = get_calls_tags(calls)
+    versions = await aget_tag_versions(tags) if tags else []
+    return {make_tag_key(tag): version for tag, version in zip(tags, versions)}
+
+
+def get_many(calls):
+    """
+    Fetches raw cache entries for many (viewlet, merged_args) calls,
+    with one get_many per cache backend. Misses are included as None,
+    already memoized entries are left out. Tag versions of the calls are
+    included, for their keys to be built without fetching them again.
+    """
+    calls = list(calls)
+    entries = get_tag_entries(calls)
+
+    keys = {}
+    with prefetched(entries):
+        for viewlet, merged_args in calls:
+            if viewlet.is_using_cache():
+                cache_key = viewlet._build_cache_key(*merged_args[1:])
+                if local_get(cache_key) is not MISSING:
+                    continue
+                if viewlet._local_cache_get(cache_key) is not MISSING:
+                    continue
+                # Group by identity, cache proxies are not hashable
+                _, cache_keys = keys.setdefault(
+                    id(viewlet.cache), (viewlet.cache, set())
+                )
+                cache_keys.add(cache_key)
+
+    for cache, cache_keys in keys.values():
+        found = cache.get_many(cache_keys)
+        for key in cache_keys:
+            entries[key] = found.get(key)
+            if entries[key] is not None:
+                local_set(key, entries[key])
+    return entries
+
+
+def compute_many(calls, entries, request=None):
+    """
+    Concurrently computes and caches (viewlet, merged_args) calls missing in
+    entries fetched by get_many, on the worker pool. Returns updated entries.
+    Failed calls are left missing, to fail when called in order.
+    """
+    if in_worker():
+        return entries
+
+    futures = {}
+    # Keys are built from the fetched tag versions, in workers too
+    with prefetched(entries) as scoped:
+        for viewlet, merged_args in calls:
+            if viewlet.is_using_cache():
+                cache_key = viewlet._build_cache_key(*merged_args[1:])
+                if cache_key in entries and entries[cache_key] is None:
+                    if cache_key not in futures:
+                        futures[cache_key] = submit(
+                            copy_context().run,
+                            viewlet._call,
+                            merged_args,
+                            request=request,
+                        )
+
+    for cache_key, future in futures.items():
+        try:
+            future.result()
+        except Exception:
+            continue
+        # Encoded entries are set on the scoped entries when workers cache them
+        entries[cache_key] = scoped[cache_key]
+    return entries
+
+
+async def aget_many(calls):
+    """
+    Async version of get_many().
+    """
+    calls = list(calls)
+    entries = await aget_tag_entries(calls)
+
+    keys = {}
+    with prefetched(entries):
+        for viewlet, merged_args in calls:
+            if viewlet.is_using_cache():
+                cache_key = await viewlet._abuild_cache_key(*merged_args[1:])
+                if local_get(cache_key) is not MISSING:
+                    continue
+                _, cache_keys = keys.setdefault(
+                    id(viewlet.cache), (viewlet.cache, set())
+                )
+                cache_keys.add(cache_key)
+
+    for cache, cache_keys in keys.values():
+        found = await cache.aget_many(cache_keys)
+        for key in cache_keys:
+            entries[key] = found.get(key)
+            if entries[key] is not None:
+                local_set(key, entries[key])
+    return entries
+
 
 class Viewlet:
     """
@@ -33,14 +228,43 @@ class Viewlet:
         timeout=DEFAULT_TIMEOUT,
         using=None,
         cached=True,
+        cache_rendered=None,
+        lock=None,
+        soft_timeout=None,
+        local_timeout=None,
+        tags=None,
+        depends_on=None,
+        warmup=None,
     ):
         self.library = library
         self.name = name
         self.template = template
         self.key = key
+        self.key_format = None
+        self._cached_make_key = None
         self.has_args = False
         self.cache_alias = using
         self.cache = get_cache(alias=using)
+        if cache_rendered is None:
+            cache_rendered = settings.VIEWLET_CACHE_RENDERED
+        self.cache_rendered = cache_rendered
+        if lock is None:
+            lock = settings.VIEWLET_CACHE_LOCK
+        self.lock = lock
+        self.soft_timeout = soft_timeout
+        if local_timeout is None:
+            local_timeout = settings.VIEWLET_LOCAL_CACHE_TIMEOUT
+        self.local_timeout = local_timeout
+        self._generation = (0, None)
+        self._version = (0, None)
+        self.tags = tags
+        self.depends_on = [
+            apps.get_model(model) if isinstance(model, str) else model
+            for model in depends_on or ()
+        ]
+        for model in self.depends_on:
+            connect_model(model)
+        self.warmup = warmup
         if timeout is None:
             # Handle infinite caching, due to Django's cache backend not respecting 0
             self.timeout = settings.VIEWLET_INFINITE_CACHE_TIMEOUT
@@ -62,12 +286,32 @@ class Viewlet:
         function as the actual wrapper
         """
         self.viewlet_func = func
+        self.is_async = asyncio.iscoroutinefunction(func)
+        if self.is_async and async_to_sync is None:
+            raise ViewletException("Async viewlet functions require Django 3.0+")
         self.viewlet_func_args = list(inspect.signature(func).parameters.keys())
         self.has_args = len(self.viewlet_func_args) > 1
+        # Argument binding plan, keeping _build_args off the signature
+        self._arg_index = {arg: i for i, arg in enumerate(self.viewlet_func_args)}
+        self._arg_defaults = (None,) * len(self.viewlet_func_args)
 
         if not self.name:
             self.name = getattr(func, "func_name", func.__name__)
 
+        if not callable(self.key):
+            try:
+                self.key_format = get_key_format(self)
+            except ViewletException:
+                pass  # Raised again when building keys
+        if (
+            settings.VIEWLET_CACHE_KEY_LRU_SIZE
+            and not callable(self.key)
+            and default_key_func in PURE_KEY_FUNCTIONS
+        ):
+            self._cached_make_key = lru_cache(settings.VIEWLET_CACHE_KEY_LRU_SIZE)(
+                self._make_typed_key
+            )
+
         self.library.add(self)
 
         def call_with_refresh(*args, **kwargs):
@@ -75,27 +319,68 @@ class Viewlet:
 
         call_with_refresh.refresh = self.refresh
         call_with_refresh.expire = self.expire
+        call_with_refresh.acall = self.acall
 
         return call_with_refresh
 
     def _build_args(self, *args, **kwargs):
-        viewlet_func_kwargs = {
-            self.viewlet_func_args[i]: args[i] for i in range(0, len(args))
-        }
-        viewlet_func_kwargs.update(
-            {k: kwargs[k] for k in kwargs if k in self.viewlet_func_args}
-        )
-        return [viewlet_func_kwargs.get(arg) for arg in self.viewlet_func_args]
+        """
+        Binds call arguments to a list of all viewlet function arguments, in order,
+        ignoring unknown kwargs and defaulting missing arguments to None.
+        """
+        count = len(args)
+        defaults = self._arg_defaults
+        if count > len(defaults):
+            raise IndexError(
+                "Viewlet %s takes %d arguments, %d given"
+                % (self.name, len(defaults), count)
+            )
+        merged_args = list(args)
+        if count < len(defaults):
+            merged_args.extend(defaults[count:])
+        if kwargs:
+            index = self._arg_index
+            for arg, value in kwargs.items():
+                i = index.get(arg)
+                if i is not None:
+                    merged_args[i] = value
+        return merged_args
+
+    def _make_key(self, args):
+        key = self.key
+        if key and callable(key):
+            return key(self, args)
+        return default_key_func(self, args)
+
+    def _make_typed_key(self, args, types):
+        # Types are part of the memoized call, as equal 1, 1.0 and True make distinct keys
+        return self._make_key(args)
 
     def _build_cache_key(self, *args):
         """
         Build cache key based on viewlet argument except initial context argument.
         """
-        key = self.key
-        if key and callable(key):
-            key = key(self, args)
+        tags = self.get_tags(*args) if self.tags or self.depends_on else None
+        tag_versions = get_tag_versions(tags) if tags else None
+        return self._format_cache_key(args, self.get_version(), tag_versions)
+
+    async def _abuild_cache_key(self, *args):
+        """
+        Async version of _build_cache_key().
+        """
+        tags = self.get_tags(*args) if self.tags or self.depends_on else None
+        tag_versions = await aget_tag_versions(tags) if tags else None
+        return self._format_cache_key(args, await self.aget_version(), tag_versions)
+
+    def _format_cache_key(self, args, version, tag_versions):
+        types = tuple(map(type, args))
+        if self._cached_make_key is not None and KEY_CACHE_TYPES.issuperset(types):
+            key = self._cached_make_key(args, types)
         else:
-            key = default_key_func(self, args)
+            key = self._make_key(args)
+        key = "%s:%s" % (key, version)
+        if tag_versions:
+            key = "%s:%s" % (key, digest_args(tag_versions))
         max_len = settings.VIEWLET_CACHE_KEY_MAX_LENGTH
         assert (
             len(key) <= max_len
@@ -104,19 +389,132 @@ class Viewlet:
         )
         return key
 
+    def get_version(self):
+        """
+        Returns the combined global namespace and viewlet version.
+        Checked at most once per interval.
+        """
+        checked_at, version = self._version
+        now = time()
+        if now - checked_at >= settings.VIEWLET_VERSION_CHECK_INTERVAL:
+            version = "%s.%s" % tuple(get_versions(self.name))
+            self._version = (now, version)
+        return version
+
+    async def aget_version(self):
+        """
+        Async version of get_version().
+        """
+        checked_at, version = self._version
+        now = time()
+        if now - checked_at >= settings.VIEWLET_VERSION_CHECK_INTERVAL:
+            version = "%s.%s" % tuple(await aget_versions(self.name))
+            self._version = (now, version)
+        return version
+
+    def flush(self):
+        """
+        Flushes all cached entries of the viewlet, with a single cache write.
+        """
+        flush_versions(self.name)
+        self._version = (0, None)
+
+    def get_tags(self, *args):
+        """
+        Returns invalidation tags of the viewlet, static or computed from args,
+        followed by tags of models the viewlet depends on.
+        """
+        if callable(self.tags):
+            tags = list(self.tags(*args))
+        else:
+            tags = list(self.tags or ())
+        tags.extend(make_model_tag(model) for model in self.depends_on)
+        return tags
+
     def _cache_get(self, key):
-        s = self.cache.get(key)
+        return self._cache_get_entry(key)[0]
+
+    def _cache_get_entry(self, key):
+        """
+        Returns cached value and whether it is past the viewlet soft timeout.
+        """
+        s = local_get(key)
+        if s is MISSING:
+            s = self._local_cache_get(key)
+            if s is MISSING:
+                s = self.cache.get(key)
+                if s is not None:
+                    self._local_cache_set(key, s)
+            if s is not None:
+                local_set(key, s)
+        return self._decode_entry(s)
+
+    def _decode_entry(self, s):
+        stale = False
+        if self.soft_timeout is not None and isinstance(s, tuple):
+            stale_at, s = s
+            stale = time() >= stale_at
         if isinstance(s, bytes):
-            s = smart_str(s)
-        return s
+            s = loads(decompress(s))
+        return s, stale
+
+    def _encode_entry(self, value):
+        # Avoid pickling string like objects, i.e. SafeString
+        if isinstance(value, str):
+            if settings.VIEWLET_STRING_STORAGE == "str":
+                value = str.__str__(value)
+            else:
+                value = smart_bytes(value)
+        elif settings.VIEWLET_SERIALIZER and value is not None:
+            value = dumps(value, settings.VIEWLET_SERIALIZER)
+        compressor = settings.VIEWLET_COMPRESSOR
+        if (
+            compressor
+            and isinstance(value, (bytes, str))
+            and len(value) >= settings.VIEWLET_COMPRESS_MIN_SIZE
+        ):
+            value = compress(smart_bytes(value), compressor)
+        if self.soft_timeout is not None:
+            value = (time() + self.soft_timeout, value)
+        return value
 
     def _cache_set(self, key, value):
-        timeout = self.timeout
+        value = self._encode_entry(value)
+        self.cache.set(key, value, self.timeout)
+        self._local_cache_set(key, value)
+        local_set(key, value)
 
-        # Avoid pickling string like objects
-        if isinstance(value, str):
-            value = smart_bytes(value)
-        self.cache.set(key, value, timeout)
+    def _local_cache_get(self, key):
+        if not self.is_using_local_cache():
+            return MISSING
+        return local_cache.get(key, self._get_generation())
+
+    def _local_cache_set(self, key, value):
+        if self.is_using_local_cache():
+            local_cache.set(key, value, self.local_timeout, self._get_generation())
+
+    def _build_generation_key(self):
+        return "viewlet:generation:%s" % self.name
+
+    def _get_generation(self):
+        """
+        Returns the viewlet generation shared by all processes, which invalidates
+        local cache entries when changed. Checked at most once per interval.
+        """
+        checked_at, generation = self._generation
+        now = time()
+        if now - checked_at >= settings.VIEWLET_LOCAL_CACHE_GENERATION_INTERVAL:
+            generation = self.cache.get(self._build_generation_key())
+            self._generation = (now, generation)
+        return generation
+
+    def _bump_generation(self):
+        self.cache.set(
+            self._build_generation_key(),
+            uuid4().hex,
+            settings.VIEWLET_INFINITE_CACHE_TIMEOUT,
+        )
+        self._generation = (0, None)
 
     def call(self, *args, **kwargs):
         """
@@ -125,27 +523,54 @@ class Viewlet:
         refresh = kwargs.pop("refresh", False)
         request = kwargs.pop("request", None)
         merged_args = self._build_args(*args, **kwargs)
-        output = self._call(merged_args, refresh)
+        output = self._call(merged_args, refresh, request=request)
+
+        # Render template for context viewlets, unless cached already rendered
+        if self.template and not self.is_caching_rendered():
+            output = self._render_output(merged_args[0], output, request=request)
 
-        # Render template for context viewlets
-        if self.template:
-            context = merged_args[0]
+        return smart_str(output)
 
-            if isinstance(context, BaseContext):
-                context.push()
+    def _render_output(self, context, output, request=None):
+        """
+        Renders the viewlet template with the viewlet output merged into context.
+        """
+        if isinstance(context, BaseContext):
+            context.push()
+            context.update(output)
+        elif request is not None:
+            # Templates copy the context given with a request, build the copy at once
+            if isinstance(context, LayeredContext):
+                context = context.flatten()
             else:
                 context = dict(context)
-
             context.update(output)
-            kw = {"request": request}
-            output = self.render(context, **kw)
+        else:
+            # Layer output on top of the context, instead of copying it
+            context = LayeredContext(output, context)
 
-            if isinstance(context, BaseContext):
-                context.pop()
+        kw = {"request": request}
+        output = self.render(context, **kw)
 
-        return smart_str(output)
+        if isinstance(context, BaseContext):
+            context.pop()
+
+        return output
 
-    def _call(self, merged_args, refresh=False):
+    def _execute(self, merged_args, request=None):
+        """
+        Executes the viewlet function, rendering its template if the rendered
+        output is what should be cached.
+        """
+        if self.is_async:
+            output = async_to_sync(self.viewlet_func)(*merged_args)
+        else:
+            output = self.viewlet_func(*merged_args)
+        if self.is_caching_rendered():
+            output = self._render_output(merged_args[0], output, request=request)
+        return output
+
+    def _call(self, merged_args, refresh=False, request=None):
         """
         Executes the actual call to the viewlet function and handles all the cache logic
         """
@@ -158,31 +583,227 @@ class Viewlet:
         if refresh or not self.is_using_cache():
             output = None
         else:
-            output = self._cache_get(cache_key)
+            output, stale = self._cache_get_entry(cache_key)
+            if stale:
+                self._revalidate(cache_key, merged_args)
 
         # First viewlet execution, forced refresh or cache timeout
         if output is None:
-            output = self.viewlet_func(*merged_args)
-            if self.is_using_cache():
-                self._cache_set(cache_key, output)
+            if refresh or not self.is_using_lock():
+                output = self._execute(merged_args, request=request)
+                if self.is_using_cache():
+                    self._cache_set(cache_key, output)
+            else:
+                output = self._locked_call(cache_key, merged_args, request=request)
 
         return output
 
+    def _revalidate(self, cache_key, merged_args):
+        """
+        Schedules a refresh of a stale viewlet, unless one is already in progress.
+        """
+        lock_key = self._build_lock_key(cache_key)
+        if self.cache.add(lock_key, 1, settings.VIEWLET_CACHE_LOCK_TIMEOUT):
+            refresh_func = import_by_path(settings.VIEWLET_STALE_REFRESH_FUNCTION)
+            refresh_func(self, *merged_args[1:])
+
+    def _build_lock_key(self, cache_key):
+        return "%s:lock" % cache_key
+
+    def _locked_call(self, cache_key, merged_args, request=None):
+        """
+        Single-flight recompute of an expired viewlet, using cache.add as a lock.
+        Processes not holding the lock wait for the lock holder to fill the cache.
+        """
+        lock_key = self._build_lock_key(cache_key)
+
+        if not self.cache.add(lock_key, 1, settings.VIEWLET_CACHE_LOCK_TIMEOUT):
+            deadline = time() + settings.VIEWLET_CACHE_LOCK_WAIT
+            while time() < deadline:
+                sleep(settings.VIEWLET_CACHE_LOCK_POLL_INTERVAL)
+                output = self._cache_poll(cache_key)
+                if output is not None:
+                    return output
+
+            # Lock holder is too slow or died, recompute without the lock
+            output = self._execute(merged_args, request=request)
+            self._cache_set(cache_key, output)
+            return output
+
+        try:
+            output = self._execute(merged_args, request=request)
+            self._cache_set(cache_key, output)
+        finally:
+            self.cache.delete(lock_key)
+
+        return output
+
+    def _cache_poll(self, key):
+        """
+        Returns the cached value from the backend, skipping prefetched and memoized
+        entries, which hold the miss the lock holder is filling.
+        """
+        s = self.cache.get(key)
+        if s is not None:
+            local_set(key, s)
+        return self._decode_entry(s)[0]
+
     def is_using_cache(self):
         return self.timeout != 0
 
-    def render(self, context, **kwargs):
+    async def acall(self, *args, **kwargs):
+        """
+        Async version of call(), using the async cache API and
+        awaiting async viewlet functions.
+        """
+        refresh = kwargs.pop("refresh", False)
+        request = kwargs.pop("request", None)
+        merged_args = self._build_args(*args, **kwargs)
+        output = await self._acall(merged_args, refresh, request=request)
+
+        if self.template and not self.is_caching_rendered():
+            output = await sync_to_async(self._render_output)(
+                merged_args[0], output, request=request
+            )
+
+        return smart_str(output)
+
+    async def _aexecute(self, merged_args, request=None):
+        if self.is_async:
+            output = await self.viewlet_func(*merged_args)
+        else:
+            output = await sync_to_async(self.viewlet_func)(*merged_args)
+        if self.is_caching_rendered():
+            output = await sync_to_async(self._render_output)(
+                merged_args[0], output, request=request
+            )
+        return output
+
+    async def _acall(self, merged_args, refresh=False, request=None):
+        if self.is_using_cache():
+            cache_key = await self._abuild_cache_key(*merged_args[1:])
+        else:
+            cache_key = None
+
+        if refresh or not self.is_using_cache():
+            output = None
+        else:
+            output, stale = await self._acache_get_entry(cache_key)
+            if stale:
+                await sync_to_async(self._revalidate)(cache_key, merged_args)
+
+        if output is None:
+            if refresh or not self.is_using_lock():
+                output = await self._aexecute(merged_args, request=request)
+                if self.is_using_cache():
+                    await self._acache_set(cache_key, output)
+            else:
+                output = await self._alocked_call(
+                    cache_key, merged_args, request=request
+                )
+
+        return output
+
+    async def _alocked_call(self, cache_key, merged_args, request=None):
+        lock_key = self._build_lock_key(cache_key)
+
+        if not await self.cache.aadd(lock_key, 1, settings.VIEWLET_CACHE_LOCK_TIMEOUT):
+            deadline = time() + settings.VIEWLET_CACHE_LOCK_WAIT
+            while time() < deadline:
+                await asyncio.sleep(settings.VIEWLET_CACHE_LOCK_POLL_INTERVAL)
+                output = await self._acache_poll(cache_key)
+                if output is not None:
+                    return output
+
+            output = await self._aexecute(merged_args, request=request)
+            await self._acache_set(cache_key, output)
+            return output
+
+        try:
+            output = await self._aexecute(merged_args, request=request)
+            await self._acache_set(cache_key, output)
+        finally:
+            await self.cache.adelete(lock_key)
+
+        return output
+
+    async def _acache_poll(self, key):
+        s = await self.cache.aget(key)
+        if s is not None:
+            local_set(key, s)
+        return self._decode_entry(s)[0]
+
+    async def _acache_get_entry(self, key):
+        s = local_get(key)
+        if s is MISSING:
+            if self.is_using_local_cache():
+                s = local_cache.get(key, await self._aget_generation())
+            if s is MISSING:
+                s = await self.cache.aget(key)
+                if s is not None and self.is_using_local_cache():
+                    local_cache.set(
+                        key, s, self.local_timeout, await self._aget_generation()
+                    )
+            if s is not None:
+                local_set(key, s)
+        return self._decode_entry(s)
+
+    async def _acache_set(self, key, value):
+        value = self._encode_entry(value)
+        await self.cache.aset(key, value, self.timeout)
+        if self.is_using_local_cache():
+            local_cache.set(
+                key, value, self.local_timeout, await self._aget_generation()
+            )
+        local_set(key, value)
+
+    async def _aget_generation(self):
+        checked_at, generation = self._generation
+        now = time()
+        if now - checked_at >= settings.VIEWLET_LOCAL_CACHE_GENERATION_INTERVAL:
+            generation = await self.cache.aget(self._build_generation_key())
+            self._generation = (now, generation)
+        return generation
+
+    def is_using_local_cache(self):
+        return bool(self.local_timeout and self.is_using_cache())
+
+    def is_using_lock(self):
+        return bool(self.lock and self.is_using_cache())
+
+    def is_caching_rendered(self):
+        return bool(self.template and self.cache_rendered and self.is_using_cache())
+
+    def render(self, context, request=None, using=None):
         """
         Renders the viewlet template.
         """
-        return render_to_string(self.template, context, **kwargs)
+        if isinstance(self.template, (list, tuple)):
+            template = select_template(self.template, using=using)
+        else:
+            template = get_template(self.template, using=using)
+        # Only Django templates without a request look keys up in the given dict,
+        # others copy it, which is much faster from a flat dict than through layers
+        if isinstance(context, LayeredContext) and (
+            request is not None or not isinstance(template, DjangoTemplate)
+        ):
+            context = context.flatten()
+        return template.render(context, request)
 
     def refresh(self, *args, **kwargs):
         """
         Shortcut to _call() with the refresh arg set to True to force a cache update.
         """
         merged_args = self._build_args({}, *args, **kwargs)
-        return self._call(merged_args, refresh=True)
+        if self.is_using_local_cache():
+            self._bump_generation()
+        try:
+            return self._call(merged_args, refresh=True)
+        finally:
+            if self.soft_timeout is not None:
+                # Release lock taken when scheduling a stale refresh
+                cache_key = self._build_cache_key(*merged_args[1:])
+                self.cache.delete(self._build_lock_key(cache_key))
 
     def expire(self, *args, **kwargs):
         """
@@ -191,3 +812,7 @@ class Viewlet:
         merged_args = self._build_args({}, *args, **kwargs)
         dyna_key = self._build_cache_key(*merged_args[1:])
         self.cache.delete(dyna_key)
+        local_set(dyna_key, None)
+        if self.is_using_local_cache():
+            local_cache.delete(dyna_key)
+            self._bump_generation()
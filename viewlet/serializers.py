@@ -0,0 +1,74 @@
+import json
+import marshal
+import pickle
+
+# Header bytes, never starting valid utf-8, telling serialized values from encoded strings
+HEADERS = {
+    "pickle": b"\xfa",
+    "json": b"\xfb",
+    "marshal": b"\xfc",
+}
+
+DUMPERS = {
+    "pickle": lambda value: pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+    "json": lambda value: json.dumps(value, separators=(",", ":")).encode("utf-8"),
+    "marshal": marshal.dumps,
+}
+
+# Types json loads back as is, unlike tuples or subclasses like SafeString
+JSON_TYPES = frozenset((dict, list, str, int, float, bool, type(None)))
+
+LOADERS = {
+    HEADERS["pickle"]: pickle.loads,
+    HEADERS["json"]: json.loads,
+    HEADERS["marshal"]: marshal.loads,
+}
+
+
+def is_json_exact(value):
+    """
+    Returns whether json loads the value back as is, holding plain types and string keys only.
+    """
+    stack, seen = [value], set()
+    while stack:
+        value = stack.pop()
+        cls = type(value)
+        if cls not in JSON_TYPES:
+            return False
+        if cls is dict or cls is list:
+            if id(value) in seen:
+                return False
+            seen.add(id(value))
+            if cls is dict:
+                if not all(type(key) is str for key in value):
+                    return False
+                stack.extend(value.values())
+            else:
+                stack.extend(value)
+    return True
+
+
+def dumps(value, serializer):
+    """
+    Serializes a value with the named serializer, prefixed with its header byte.
+    Values the serializer would not load back as is are pickled instead.
+    """
+    if serializer == "json" and not is_json_exact(value):
+        serializer = "pickle"
+    try:
+        data = DUMPERS[serializer](value)
+    except ValueError:
+        # Raised by marshal for types it does not support, like SafeString
+        serializer = "pickle"
+        data = DUMPERS[serializer](value)
+    return HEADERS[serializer] + data
+
+
+def loads(data):
+    """
+    Deserializes bytes starting with a serializer header byte, otherwise decodes them as a utf-8 string.
+    """
+    loader = LOADERS.get(data[:1])
+    if loader is None:
+        return data.decode("utf-8")
+    return loader(data[1:])
@@ -3,36 +3,146 @@ import re
 
 from django import template
 from django.template import TemplateSyntaxError
+from django.template.defaulttags import AutoEscapeControlNode, SpacelessNode
+from django.template.loader_tags import BLOCK_CONTEXT_KEY, BlockNode
 from django.utils.safestring import mark_safe
 
 import viewlet
+from viewlet.cache import prefetched
+from viewlet.conf import settings
+from viewlet.context import LayeredContext
 from viewlet.exceptions import UnknownViewlet
+from viewlet.models import compute_many, get_many
 
 logger = logging.getLogger(__name__)
 register = template.Library()
 kwarg_re = re.compile(r"(?:(\w+)=)?(.+)")
 
+# Tags always rendering their body in the same context, unlike conditions or loops
+TRANSPARENT_NODES = (BlockNode, AutoEscapeControlNode, SpacelessNode)
+
 
 class ViewletNode(template.Node):
+    prefetch_key = "viewlet_prefetched"
+    arguments_key = "viewlet_arguments"
+
     def __init__(self, viewlet_name, args, kwargs):
         self.viewlet_name = viewlet_name
         self.viewlet_args = args
         self.viewlet_kwargs = kwargs
+        self.viewlet = None
 
     def render(self, context):
         try:
-            args = [arg.resolve(context) for arg in self.viewlet_args]
-            kwargs = {
-                key: value.resolve(context)
-                for key, value in self.viewlet_kwargs.items()
-            }
-            context = context.flatten() if hasattr(context, "flatten") else context
-            template = viewlet.call(self.viewlet_name, context, *args, **kwargs)
+            v = self.get_viewlet()
+            entries = self.prefetch(context)
+            args, kwargs = self.get_arguments(context)
+            # Look keys up through the context layers instead of flattening them
+            context = LayeredContext.from_context(context)
+            with prefetched(entries):
+                template = v.call(context, *args, **kwargs)
             return mark_safe(template)
         except UnknownViewlet as e:
             logger.exception(e)
             raise
 
+    def get_viewlet(self):
+        """
+        Returns the viewlet of the tag, looked up once on first render.
+        """
+        if self.viewlet is None:
+            self.viewlet = viewlet.get(self.viewlet_name)
+        return self.viewlet
+
+    def resolve_arguments(self, context, ignore_failures=False):
+        args = [
+            arg.resolve(context, ignore_failures=ignore_failures)
+            for arg in self.viewlet_args
+        ]
+        kwargs = {
+            key: value.resolve(context, ignore_failures=ignore_failures)
+            for key, value in self.viewlet_kwargs.items()
+        }
+        return args, kwargs
+
+    def get_arguments(self, context):
+        """
+        Returns the arguments resolved ahead when prefetching, once, or resolves them,
+        for lookups running queries to run once per render.
+        """
+        resolved = context.render_context.get(self.arguments_key)
+        if resolved and self in resolved:
+            return resolved.pop(self)
+        return self.resolve_arguments(context)
+
+    def prefetch(self, context):
+        """
+        Fetches cached output of all viewlets certain to render in the template
+        at once, on first viewlet render, computing misses in parallel if enabled.
+        Viewlets with unresolvable arguments are left to fetch on their own,
+        the others get the resolved arguments when rendered.
+        """
+        render_context = context.render_context
+        if self.prefetch_key in render_context:
+            return render_context[self.prefetch_key]
+
+        entries, resolved = {}, {}
+        if settings.VIEWLET_TEMPLATE_PREFETCH and render_context.template:
+            parallel = settings.VIEWLET_PARALLEL_RENDER
+            shared = LayeredContext.from_context(context) if parallel else {}
+            calls = []
+            for node in self.get_template_nodes(context):
+                try:
+                    v = node.get_viewlet()
+                    args, kwargs = node.resolve_arguments(context, ignore_failures=True)
+                except Exception:
+                    # Raised again when rendering the node itself
+                    continue
+                if None in args or None in kwargs.values():
+                    continue
+                resolved[node] = (args, kwargs)
+                # Viewlets computed in parallel get a context layer of their own
+                calls.append(
+                    (v, v._build_args(LayeredContext(shared), *args, **kwargs))
+                )
+            if len(calls) > 1:
+                entries = get_many(calls)
+                if parallel:
+                    entries = compute_many(calls, entries)
+
+        render_context[self.prefetch_key] = entries
+        render_context[self.arguments_key] = resolved
+        return entries
+
+    def get_template_nodes(self, context):
+        """
+        Returns viewlet nodes of the rendered template not nested in conditions, loops
+        or other tags, following blocks to their overriding block when extended.
+        """
+        blocks = {}
+        block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+        if block_context is not None:
+            blocks = {
+                name: stack[-1] for name, stack in block_context.blocks.items() if stack
+            }
+            # Blocks being rendered are off the block context, but on the context
+            for layer in context.dicts:
+                block = layer.get("block")
+                if isinstance(block, BlockNode):
+                    blocks[block.name] = block
+
+        nodes = []
+        nodelists = [context.render_context.template.nodelist]
+        while nodelists:
+            for node in nodelists.pop(0):
+                if isinstance(node, ViewletNode):
+                    nodes.append(node)
+                elif isinstance(node, BlockNode):
+                    nodelists.append(blocks.get(node.name, node).nodelist)
+                elif isinstance(node, TRANSPARENT_NODES):
+                    nodelists.append(node.nodelist)
+        return nodes
+
 
 @register.tag(name="viewlet")
 def viewlet_tag(parser, token):
@@ -1 +1,11 @@
-from .test_viewlet import ViewletCacheBackendTest, ViewletKeyTest, ViewletTest  # NOQA
+from .test_viewlet import (  # NOQA
+    ViewletAsyncTest,
+    ViewletCacheBackendTest,
+    ViewletCacheStrategyTest,
+    ViewletFlushTest,
+    ViewletInvalidationTest,
+    ViewletKeyTest,
+    ViewletLocalCacheTest,
+    ViewletPrefetchTest,
+    ViewletTest,
+)
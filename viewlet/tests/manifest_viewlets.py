@@ -0,0 +1,6 @@
+from viewlet import viewlet
+
+
+@viewlet(timeout=0)
+def hello_manifest(context):
+    return "Hello manifest!"
@@ -1,38 +1,88 @@
+import asyncio
+import copy
 import importlib
+import json
 import logging
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from io import StringIO
 from time import sleep, time
+from unittest import mock, skipIf
 
 import django
 import django.conf
-from django.template import TemplateSyntaxError, engines
+from django.core.cache import caches
+from django.core.management import call_command
+from django.http import HttpRequest
+from django.template import Context, TemplateSyntaxError, engines
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import translation
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from jinja2 import TemplateNotFound
 
 from .. import (
+    acall,
+    api,
+    aprefetch,
     cache as cache_m,
     call,
+    compression,
     conf,
     exceptions,
+    executor,
+    flush,
     get,
     get_version,
+    invalidate_tags,
     library,
     models,
+    prefetch,
     refresh,
     viewlet,
+    views,
+)
+from ..cache import (
+    get_cache,
+    make_key_args_digest,
+    make_key_args_hash,
+    make_key_args_join,
 )
-from ..cache import get_cache, make_key_args_join
 from ..conf import settings
+from ..const import MISSING
+from ..context import LayeredContext
 from ..exceptions import UnknownViewlet
 from ..loaders import jinja2_loader
+from ..middleware import ViewletMemoMiddleware
+from ..models import get_many
+from ..templatetags import viewlets as viewlet_tags
+from ..views import StreamingViewletResponse
 
 cache = get_cache()
 
-__all__ = ["ViewletTest", "ViewletCacheBackendTest", "ViewletKeyTest"]
+__all__ = [
+    "ViewletTest",
+    "ViewletCacheStrategyTest",
+    "ViewletInvalidationTest",
+    "ViewletFlushTest",
+    "ViewletPrefetchTest",
+    "ViewletLocalCacheTest",
+    "ViewletAsyncTest",
+    "ViewletCacheBackendTest",
+    "ViewletKeyTest",
+]
 
 
 class ViewletTest(TestCase):
     def setUp(self):
         cache.clear()
+        # Viewlets registered by previous tests outlive the cleared cache versions
+        for v in api.library.values():
+            v._version = (0, None)
 
         @viewlet
         def hello_world(context):
@@ -133,6 +183,167 @@ class ViewletTest(TestCase):
     def test_get_non_existing_viewlet(self):
         self.assertRaises(UnknownViewlet, get, "i_do_not_exist")
 
+    def test_autodiscover_once(self):
+        lib = api.library
+        lib.discovered = False
+        with mock.patch.object(lib, "autodiscover", wraps=lib.autodiscover) as discover:
+            self.assertRaises(UnknownViewlet, get, "i_do_not_exist")
+            self.assertRaises(UnknownViewlet, get, "i_do_not_exist_either")
+            get("hello_cache")
+        self.assertEqual(discover.call_count, 1)
+
+    def test_manifest(self):
+        lib = api.library
+        lib.pop("hello_manifest", None)
+        sys.modules.pop("viewlet.tests.manifest_viewlets", None)
+        manifest = {"hello_manifest": "viewlet.tests.manifest_viewlets"}
+        with mock.patch.object(lib, "_manifest", manifest), mock.patch.object(
+            lib, "autodiscover"
+        ) as discover:
+            lib.discovered = False
+            self.assertEqual(call("hello_manifest", None), "Hello manifest!")
+        self.assertFalse(discover.called)
+        lib.discovered = True
+
+    def test_stale_manifest(self):
+        lib = api.library
+        manifest = {
+            "hello_cache": "viewlet.tests.removed_viewlets",
+            "i_do_not_exist": "viewlet.tests.removed_viewlets",
+        }
+
+        def autodiscover():
+            self.setUp()  # Registers the test viewlets again
+            lib.discovered = True
+
+        lib.pop("hello_cache")
+        with mock.patch.object(lib, "_manifest", manifest), mock.patch.object(
+            lib, "autodiscover", side_effect=autodiscover
+        ) as discover:
+            lib.discovered = False
+            self.assertEqual(get("hello_cache").name, "hello_cache")
+            self.assertRaises(UnknownViewlet, get, "i_do_not_exist")
+        self.assertEqual(discover.call_count, 1)
+
+    def test_manifest_command(self):
+        out = StringIO()
+        call_command("viewlet_manifest", stdout=out)
+        manifest = json.loads(out.getvalue())
+        self.assertEqual(manifest["hello_cache"], "viewlet.tests.test_viewlet")
+
+        lib = api.library
+        with tempfile.NamedTemporaryFile(suffix=".json") as f:
+            call_command("viewlet_manifest", output=f.name)
+            with mock.patch.dict(conf.settings, VIEWLET_MANIFEST=f.name):
+                with mock.patch.object(lib, "_manifest", None):
+                    self.assertEqual(lib.get_manifest(), manifest)
+
+    def test_layered_context(self):
+        context = Context({"a": 1, "b": 2})
+        context.push(b=3)
+        layered = LayeredContext.from_context(context)
+        self.assertEqual(layered["b"], 3)
+        self.assertEqual(layered, context.flatten())
+        self.assertEqual(dict(layered), context.flatten())
+        layered["a"] = 4
+        self.assertEqual((layered["a"], context["a"]), (4, 1))
+        self.assertNotIn("c", layered)
+        self.assertIsNone(layered.get("c"))
+        self.assertEqual(layered.setdefault("b", 5), 3)
+        self.assertEqual(layered.new_child({"c": 6})["c"], 6)
+        self.assertIs(LayeredContext.from_context(layered), layered)
+
+    def test_layered_context_mutations(self):
+        base = {"a": 1, "b": 2, "c": 3}
+        layered = LayeredContext(base)
+        self.assertEqual(json.loads(json.dumps(layered)), base)
+        self.assertEqual(layered.pop("a"), 1)
+        self.assertNotIn("a", layered)
+        self.assertRaises(KeyError, layered.pop, "a")
+        self.assertIsNone(layered.pop("a", None))
+        del layered["b"]
+        self.assertRaises(KeyError, layered.__delitem__, "b")
+        self.assertEqual(layered, {"c": 3})
+        self.assertEqual(json.dumps(layered), '{"c": 3}')
+        layered["a"] = 4
+        self.assertEqual(dict([layered.popitem(), layered.popitem()]), {"a": 4, "c": 3})
+        self.assertRaises(KeyError, layered.popitem)
+        self.assertFalse(layered)
+        layered.update(b=5)
+        self.assertEqual((layered, len(layered)), ({"b": 5}, 1))
+        layered |= {"d": 6}
+        self.assertEqual(layered | {"e": 7}, {"b": 5, "d": 6, "e": 7})
+        layered.clear()
+        self.assertEqual((layered, json.dumps(layered)), ({}, "{}"))
+        self.assertEqual(LayeredContext(base).new_child({}), base)
+        self.assertEqual(base, {"a": 1, "b": 2, "c": 3})
+
+    def test_layered_context_copy(self):
+        layered = LayeredContext({"a": [1], "b": 2}).new_child({"c": 3})
+        del layered["b"]
+        for copied in (
+            pickle.loads(pickle.dumps(layered)),
+            copy.copy(layered),
+            copy.deepcopy(layered),
+        ):
+            self.assertIs(type(copied), dict)
+            self.assertEqual(copied, {"a": [1], "c": 3})
+        self.assertIsNot(copy.deepcopy(layered)["a"], layered["a"])
+
+    def test_cached_context_returning_viewlet(self):
+        @viewlet(template="hello_world.html", timeout=10)
+        def hello_context(context, name):
+            context["name"] = name
+            return context
+
+        template = self.get_django_template("{% viewlet hello_context 'wörld' %}")
+        for _ in range(2):
+            self.assertEqual(self.render(template), "Hello wörld!")
+
+    def test_render_output_layers_context(self):
+        v = get("hello_new_name")
+        context = {"name": "monkey", "other": 1}
+        output = {"name": "wörld"}
+        with mock.patch.object(
+            LayeredContext, "flatten", side_effect=LayeredContext.flatten, autospec=True
+        ) as flatten:
+            html = v._render_output(context, output)
+            self.assertFalse(flatten.called)
+            # Copied flat at once when rendered with a request
+            self.assertEqual(
+                v._render_output(context, output, request=HttpRequest()), html
+            )
+            self.assertFalse(flatten.called)
+        self.assertEqual(html.strip(), "Hello wörld!")
+        self.assertEqual(context, {"name": "monkey", "other": 1})
+        self.assertEqual(output, {"name": "wörld"})
+
+    def test_create_jinja2_env(self):
+        template_dir = os.path.join(os.path.dirname(__file__), "template_dir")
+        with tempfile.TemporaryDirectory() as cache_dir, mock.patch.dict(
+            jinja2_loader.settings,
+            VIEWLET_JINJA2_BYTECODE_CACHE_DIR=cache_dir,
+            VIEWLET_JINJA2_CACHE_SIZE=10,
+        ), override_settings(TEMPLATE_DIRS=[template_dir]):
+            env = jinja2_loader.create_env()
+            self.assertEqual(env.cache.capacity, 10)
+            template = env.get_template("hello_world.html")
+            self.assertEqual(template.render(name="wörld"), "Hello wörld!")
+            self.assertTrue(os.listdir(cache_dir))
+        templates = env.list_templates()
+        self.assertIn("hello_from_dir.html", templates)
+        self.assertIn("hello_world.html", templates)
+        self.assertRaises(TemplateNotFound, env.get_template, "i_do_not_exist.html")
+
+    def test_render_tag_resolves_viewlet_once(self):
+        template = engines["django"].from_string(
+            self.get_django_template("<h1>{% viewlet hello_world %}</h1>")
+        )
+        template.render()
+        with mock.patch.object(api.library, "get") as library_get:
+            self.assertEqual(template.render().strip(), "<h1>Hello wörld!</h1>")
+        self.assertFalse(library_get.called)
+
     def test_empty_decorator(self):
         template = self.get_django_template("<h1>{% viewlet hello_world %}</h1>")
         html1 = self.render(template)
@@ -223,6 +434,105 @@ class ViewletTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "wörld AnonymousUser!")
 
+    def test_view_http_cache(self):
+        client = Client()
+        url = reverse("viewlet", args=["hello_cache"])
+        response = client.get(url, {"name": "wörld"})
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        with mock.patch.dict(views.settings, VIEWLET_HTTP_MAX_AGE=60):
+            response = client.get(url, {"name": "wörld"})
+            self.assertEqual(response["Cache-Control"], "max-age=10")
+        with mock.patch.dict(views.settings, VIEWLET_HTTP_MAX_AGE=5):
+            response = client.get(url, {"name": "wörld"})
+            self.assertEqual(response["Cache-Control"], "max-age=5")
+        etag = response["ETag"]
+        response = client.get(url, {"name": "wörld"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        url = reverse("viewlet", args=["hello_name"])
+        response = client.get(url, {"name": "wörld"})
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        v = get("hello_name")
+        with mock.patch.object(v, "viewlet_func") as viewlet_func:
+            response = client.get(url, {"name": "wörld"}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+            response = client.get(url, {"name": "wörld"}, HTTP_IF_NONE_MATCH='"x"')
+            self.assertEqual(response.status_code, 200)
+        self.assertFalse(viewlet_func.called)
+
+        url = reverse("viewlet", args=["hello_request"])
+        response = client.get(url, {"greeting": "wörld"})
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+    def test_view_cache_miss(self):
+        url = reverse("viewlet", args=["hello_name"])
+        v = get("hello_name")
+        v.get_version()
+        with mock.patch.object(v.cache, "get", wraps=v.cache.get) as cache_get:
+            response = Client().get(url, {"name": "miss"})
+        self.assertEqual(response.content.decode(), "Hello miss")
+        self.assertEqual(cache_get.call_count, 1)
+
+    def test_batch_view(self):
+        client = Client()
+        url = reverse("viewlet_batch")
+        calls = [
+            {"name": "hello_cache", "kwargs": {"name": "wörld"}},
+            {"name": "hello_request", "args": ["Hi"]},
+            {"name": "hello_world"},
+        ]
+        response = client.get(url, {"viewlets": json.dumps(calls)})
+        self.assertEqual(response.status_code, 200)
+        fragments = response.json()["fragments"]
+        self.assertEqual(fragments[0], call("hello_cache", None, "wörld"))
+        self.assertEqual(fragments[1:], ["Hi AnonymousUser!\n", "Hello wörld!"])
+
+        response = client.post(url, json.dumps(calls), "application/json")
+        self.assertEqual(response.json()["fragments"], fragments)
+
+        response = client.post(url, "[{}]", "application/json")
+        self.assertEqual(response.status_code, 400)
+        response = client.get(url, {"viewlets": '[{"name": "unknown_viewlet"}]'})
+        self.assertEqual(response.status_code, 400)
+        too_many = [{"name": "hello_name", "args": [1, 2, 3]}]
+        response = client.get(url, {"viewlets": json.dumps(too_many)})
+        self.assertEqual(response.status_code, 400)
+        with mock.patch.dict(views.settings, VIEWLET_BATCH_MAX_CALLS=2):
+            response = client.post(url, json.dumps(calls), "application/json")
+            self.assertEqual(response.status_code, 400)
+            response = client.post(url, json.dumps(calls[:2]), "application/json")
+            self.assertEqual(response.status_code, 200)
+
+    def test_streaming_response(self):
+        calls = [
+            ("hello_name", (), {"name": "wörld"}),
+            ("hello_request", ("Hi",), {}),
+        ]
+        response = StreamingViewletResponse(
+            calls, request={"user": "nicolas cage"}, shell="<p>", tail="</p>"
+        )
+        self.assertEqual(
+            list(response.streaming_content),
+            [b"<p>", "Hello wörld".encode(), b"Hi nicolas cage!\n", b"</p>"],
+        )
+
+        shell = "".join(map(StreamingViewletResponse.placeholder, range(2)))
+        response = StreamingViewletResponse(calls, shell=shell, ordered=False)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(
+            chunks[0], '<div id="viewlet-0"></div><div id="viewlet-1"></div>'
+        )
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(
+            any(
+                chunk.startswith('<template id="viewlet-0-fragment">Hello wörld<')
+                for chunk in chunks[1:3]
+            )
+        )
+        self.assertEqual(chunks[3], "")
+
     def test_jinja_tag(self):
         template = self.get_jinja_template(
             "<h1>{% viewlet 'hello_nocache', viewlet_arg %}</h1>"
@@ -283,6 +593,71 @@ class ViewletTest(TestCase):
         cached_value = cache.get(cache_key)
         self.assertTrue(isinstance(cached_value, bytes))
 
+    def test_cached_string_storage(self):
+        template = self.get_django_template(
+            "<h1>{% viewlet hello_name name='wörld' %}</h1>"
+        )
+        with mock.patch.dict(models.settings, VIEWLET_STRING_STORAGE="str"):
+            html = self.render(template)
+        v = get("hello_name")
+        cached_value = cache.get(v._build_cache_key("wörld"))
+        self.assertIs(type(cached_value), str)
+        self.assertEqual(self.render(template), html)
+
+    def test_compressed_string(self):
+        v = get("hello_name")
+        name = "wörld" * 100
+        for compressor, header in (("zlib", b"\xf8"), ("lzma", b"\xf9")):
+            compression.metrics.reset()
+            with mock.patch.dict(
+                models.settings,
+                VIEWLET_COMPRESSOR=compressor,
+                VIEWLET_COMPRESS_MIN_SIZE=100,
+            ):
+                v.refresh(name)
+                v.refresh("wörld")
+            cached_value = cache.get(v._build_cache_key(name))
+            self.assertTrue(cached_value.startswith(header))
+            self.assertEqual(call("hello_name", None, name), "Hello %s" % name)
+            self.assertEqual(
+                cache.get(v._build_cache_key("wörld")), b"Hello w\xc3\xb6rld"
+            )
+            stats = compression.metrics.stats()
+            self.assertEqual((stats["compressed"], stats["decompressed"]), (1, 1))
+            self.assertGreater(stats["ratio"], 5)
+
+    def test_serializer(self):
+        v = get("hello_new_name")
+        html = call("hello_new_name", None, "wörld")
+        for serializer, header in (
+            ("pickle", b"\xfa"),
+            ("json", b"\xfb"),
+            ("marshal", b"\xfc"),
+        ):
+            with mock.patch.dict(models.settings, VIEWLET_SERIALIZER=serializer):
+                v.refresh("wörld")
+            cached_value = cache.get(v._build_cache_key("wörld"))
+            self.assertTrue(cached_value.startswith(header))
+            self.assertEqual(
+                v._cache_get(v._build_cache_key("wörld")), {"name": "wörld"}
+            )
+            self.assertEqual(call("hello_new_name", None, "wörld"), html)
+
+    def test_serializer_fallback(self):
+        @viewlet(template="hello_strong_world.html", timeout=10)
+        def hello_safe(context, name):
+            return {"name": mark_safe(name)}
+
+        html = call("hello_safe", None, "<b>wörld</b>")
+        self.assertIn("<strong><b>wörld</b>!</strong>", html)
+        v = get("hello_safe")
+        for serializer in ("json", "marshal"):
+            with mock.patch.dict(models.settings, VIEWLET_SERIALIZER=serializer):
+                v.refresh("<b>wörld</b>")
+                cached_value = cache.get(v._build_cache_key("<b>wörld</b>"))
+                self.assertTrue(cached_value.startswith(b"\xfa"))
+                self.assertEqual(call("hello_safe", None, "<b>wörld</b>"), html)
+
     def test_named(self):
         template = self.get_django_template(
             "<h1>{% viewlet hello_new_name 'wörld' %}</h1>"
@@ -333,6 +708,713 @@ class ViewletTest(TestCase):
         self.assertTrue(isinstance(html, str))
 
 
+class ViewletCacheStrategyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        @viewlet(template="hello_timestamp.html", timeout=10, cache_rendered=True)
+        def hello_cached_rendered(context, name):
+            return {
+                "name": name,
+                "timestamp": time(),
+            }
+
+        @viewlet(timeout=10, lock=True)
+        def hello_locked(context, name):
+            return "Hello %s! [%s]" % (name, time())
+
+        @viewlet(timeout=None, soft_timeout=0)
+        def hello_stale(context, name):
+            return "Hello %s! [%s]" % (name, time())
+
+    def test_cache_rendered(self):
+        v = get("hello_cached_rendered")
+        html1 = v.call({}, "wörld")
+        cache_key = v._build_cache_key("wörld")
+        self.assertEqual(cache.get(cache_key), html1.encode("utf8"))
+        with mock.patch.object(v, "render") as render:
+            html2 = v.call({}, "wörld")
+        self.assertFalse(render.called)
+        self.assertEqual(html1, html2)
+        self.assertTrue(html1.startswith("Hello wörld!"))
+
+    def test_cache_rendered_tag(self):
+        template = engines["django"].from_string(
+            "{% load viewlets %}<h1>{% viewlet hello_cached_rendered 'world' %}</h1>"
+        )
+        html1 = template.render()
+        sleep(0.01)
+        self.assertEqual(html1, template.render())
+        refresh("hello_cached_rendered", "world")
+        self.assertNotEqual(html1, template.render())
+
+    def test_lock(self):
+        v = get("hello_locked")
+        cache_key = v._build_cache_key("world")
+        lock_key = v._build_lock_key(cache_key)
+        with mock.patch.object(v.cache, "add", wraps=v.cache.add) as add:
+            html1 = v.call({}, "world")
+        add.assert_called_once_with(
+            lock_key, 1, models.settings.VIEWLET_CACHE_LOCK_TIMEOUT
+        )
+        self.assertIsNone(cache.get(lock_key))
+        self.assertEqual(v.call({}, "world"), html1)
+
+    def test_lock_wait(self):
+        v = get("hello_locked")
+        cache_key = v._build_cache_key("world")
+        cache.add(v._build_lock_key(cache_key), 1)
+
+        def other_process_done(seconds):
+            cache.set(cache_key, b"Hello from another process")
+
+        with mock.patch("viewlet.models.sleep", side_effect=other_process_done):
+            html = v.call({}, "world")
+        self.assertEqual(html, "Hello from another process")
+
+    def test_lock_wait_prefetched(self):
+        v = get("hello_locked")
+        cache_key = v._build_cache_key("world")
+        cache.add(v._build_lock_key(cache_key), 1)
+
+        def other_process_done(seconds):
+            cache.set(cache_key, b"Hello from another process")
+
+        # Prefetched and memoized misses must not hide the lock holder's entry
+        with cache_m.memoize(), prefetch(("hello_locked", ("world",), {})):
+            self.assertIsNone(cache_m.local_get(cache_key))
+            with mock.patch("viewlet.models.sleep", side_effect=other_process_done):
+                with mock.patch.object(v, "_execute") as execute:
+                    html = v.call({}, "world")
+            self.assertFalse(execute.called)
+            self.assertEqual(html, "Hello from another process")
+            self.assertEqual(v.call({}, "world"), html)
+
+    def test_lock_wait_timeout(self):
+        v = get("hello_locked")
+        cache_key = v._build_cache_key("world")
+        cache.add(v._build_lock_key(cache_key), 1)
+        with mock.patch.dict(models.settings, VIEWLET_CACHE_LOCK_WAIT=0.02):
+            html = v.call({}, "world")
+        self.assertTrue(html.startswith("Hello world!"))
+        self.assertEqual(v._cache_get(cache_key), html)
+
+    def test_stale_while_revalidate(self):
+        v = get("hello_stale")
+        self.assertEqual(v.timeout, settings.VIEWLET_INFINITE_CACHE_TIMEOUT)
+        html1 = v.call({}, "world")
+        cache_key = v._build_cache_key("world")
+        self.assertEqual(v._cache_get_entry(cache_key), (html1, True))
+
+        path = "viewlet.executor.refresh_viewlet"
+        with mock.patch(path) as refresh_viewlet:
+            self.assertEqual(v.call({}, "world"), html1)
+            self.assertEqual(v.call({}, "world"), html1)
+        refresh_viewlet.assert_called_once_with(v, "world")
+        lock_key = v._build_lock_key(cache_key)
+        self.assertIsNotNone(cache.get(lock_key))
+
+        sleep(0.01)
+        with mock.patch.object(executor, "submit") as submit:
+            executor.refresh_viewlet(v, "world").result()
+        # Refreshes run in the background pool, requests never wait behind them
+        self.assertFalse(submit.called)
+        self.assertIsNone(cache.get(lock_key))
+        self.assertNotEqual(v._cache_get(cache_key), html1)
+
+
+class ViewletInvalidationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        @viewlet(timeout=10, tags=lambda id: ["products", "product:%s" % id])
+        def product_teaser(context, id):
+            return "Product %s [%s]" % (id, time())
+
+        @viewlet(timeout=10, tags=["products"])
+        def product_list(context):
+            return "Products [%s]" % time()
+
+    def test_invalidate_tags(self):
+        v = get("product_teaser")
+        self.assertEqual(v.get_tags(1), ["products", "product:1"])
+        teaser1, teaser2 = call("product_teaser", None, 1), call(
+            "product_teaser", None, 2
+        )
+        products = call("product_list", None)
+        sleep(0.01)
+
+        invalidate_tags("product:1")
+        self.assertNotEqual(call("product_teaser", None, 1), teaser1)
+        self.assertEqual(call("product_teaser", None, 2), teaser2)
+        self.assertEqual(call("product_list", None), products)
+
+        invalidate_tags("products")
+        self.assertNotEqual(call("product_teaser", None, 2), teaser2)
+        self.assertNotEqual(call("product_list", None), products)
+
+    @skipIf(django.VERSION < (3, 2), "captureOnCommitCallbacks requires Django 3.2+")
+    def test_depends_on(self):
+        from django.contrib.auth.models import Group
+
+        @viewlet(timeout=10, depends_on=[Group, "flatpages.FlatPage"])
+        def group_list(context):
+            return ", ".join(Group.objects.values_list("name", flat=True))
+
+        v = get("group_list")
+        self.assertEqual(v.get_tags(), ["model:auth.group", "model:flatpages.flatpage"])
+        self.assertEqual(call("group_list", None), "")
+        with self.captureOnCommitCallbacks(execute=True):
+            group = Group.objects.create(name="monkeys")
+            # Invalidated on commit, not while the transaction is open
+            self.assertEqual(call("group_list", None), "")
+        self.assertEqual(call("group_list", None), "monkeys")
+        with self.captureOnCommitCallbacks(execute=True):
+            group.delete()
+        self.assertEqual(call("group_list", None), "")
+
+    def test_evicted_tag_version(self):
+        products = call("product_list", None)
+        cache.delete(cache_m.make_tag_key("products"))
+        self.assertNotEqual(call("product_list", None), products)
+
+
+class ViewletFlushTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        @viewlet(timeout=10)
+        def hello_flush(context, name):
+            return "Hello %s! [%s]" % (name, time())
+
+        @viewlet(timeout=10, key="hello_flush_custom")
+        def hello_flush_custom(context):
+            return "Hello! [%s]" % time()
+
+    def tearDown(self):
+        cache.clear()
+        for name in ("hello_flush", "hello_flush_custom"):
+            get(name)._version = (0, None)
+
+    def test_flush(self):
+        v = get("hello_flush")
+        self.assertEqual(
+            v._build_cache_key("world"),
+            "%s:%s" % (make_key_args_digest(v, ["world"]), v.get_version()),
+        )
+        html1, html2 = call("hello_flush", None, "world"), call(
+            "hello_flush_custom", None
+        )
+        sleep(0.01)
+
+        v.flush()
+        self.assertNotEqual(call("hello_flush", None, "world"), html1)
+        self.assertEqual(call("hello_flush_custom", None), html2)
+
+        html1 = call("hello_flush", None, "world")
+        flush()
+        self.assertNotEqual(call("hello_flush", None, "world"), html1)
+        self.assertNotEqual(call("hello_flush_custom", None), html2)
+        self.assertTrue(
+            get("hello_flush_custom")
+            ._build_cache_key()
+            .startswith("hello_flush_custom:")
+        )
+
+    def test_evicted_version(self):
+        v = get("hello_flush")
+        html1 = call("hello_flush", None, "world")
+        flush()
+        html2 = call("hello_flush", None, "world")
+        self.assertNotEqual(html2, html1)
+
+        # Entries from before the flush must not become valid again
+        cache.delete(cache_m.NAMESPACE_VERSION_KEY)
+        v._version = (0, None)
+        html3 = call("hello_flush", None, "world")
+        self.assertNotIn(html3, (html1, html2))
+        self.assertEqual(call("hello_flush", None, "world"), html3)
+
+    def test_flush_command(self):
+        html = call("hello_flush", None, "world")
+        out = StringIO()
+        call_command("flush_viewlets", "hello_flush", stdout=out)
+        self.assertEqual(out.getvalue(), "Flushed viewlets: hello_flush\n")
+        sleep(0.01)
+        self.assertNotEqual(call("hello_flush", None, "world"), html)
+
+        html = call("hello_flush", None, "world")
+        call_command("flush_viewlets", stdout=out)
+        self.assertTrue(out.getvalue().endswith("Flushed all viewlets\n"))
+        self.assertNotEqual(call("hello_flush", None, "world"), html)
+
+    def test_warm_command(self):
+        @viewlet(timeout=10, warmup=lambda: ["a", ("b",), {"name": "c"}])
+        def hello_warm(context, name):
+            return "Hello %s! [%s]" % (name, time())
+
+        out = StringIO()
+        call_command("warm_viewlets", "hello_warm", workers=2, stdout=out)
+        self.assertTrue(out.getvalue().startswith("hello_warm: warmed 3 in "))
+        v = get("hello_warm")
+        for name in ("a", "b", "c"):
+            self.assertIsNotNone(v._cache_get(v._build_cache_key(name)))
+
+        html = call("hello_warm", None, "a")
+        sleep(0.01)
+        call_command("warm_viewlets", stdout=out)
+        self.assertNotEqual(call("hello_warm", None, "a"), html)
+        self.assertNotIn("hello_flush", out.getvalue())
+
+
+class ViewletPrefetchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        @viewlet(timeout=10)
+        def hello_prefetch(context, name):
+            return "Hello %s!" % name
+
+        @viewlet(template="hello_world.html", timeout=10)
+        def hello_prefetch_context(context, name):
+            return {"name": name}
+
+        self.backend = caches["default"]
+
+        # Only count round trips of viewlet entries, not of version checks
+        patcher = mock.patch.dict(models.settings, VIEWLET_VERSION_CHECK_INTERVAL=60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in ("hello_prefetch", "hello_prefetch_context"):
+            get(name)._version = (0, None)
+            get(name).get_version()
+
+    def assertRoundTrips(self, render, gets, get_manys):
+        backend_get = self.backend.get
+
+        def backend_get_many(keys, **kwargs):
+            found = ((key, backend_get(key)) for key in keys)
+            return {key: value for key, value in found if value is not None}
+
+        with mock.patch.object(self.backend, "get", wraps=backend_get) as get:
+            with mock.patch.object(
+                self.backend, "get_many", side_effect=backend_get_many
+            ) as get_many:
+                html = render()
+        self.assertEqual(get.call_count, gets)
+        self.assertEqual(get_many.call_count, get_manys)
+        return html
+
+    def test_django_prefetch(self):
+        template = engines["django"].from_string(
+            "{% load viewlets %}"
+            "{% viewlet hello_prefetch 'world' %}"
+            "{% viewlet hello_prefetch_context name %}"
+            "{% for n in names %}{% viewlet hello_prefetch n %}{% endfor %}"
+        )
+        context = {"name": "wörld", "names": ["a"]}
+        html1 = self.assertRoundTrips(lambda: template.render(context), 1, 1)
+        html2 = self.assertRoundTrips(lambda: template.render(context), 1, 1)
+        self.assertEqual(html1, html2)
+        self.assertEqual(html1, "Hello world!Hello wörld!\nHello a!")
+
+    def test_prefetch_resolves_arguments_once(self):
+        class Counter:
+            count = 0
+
+            def items(self):
+                self.count += 1
+                return self.count
+
+        django_template = engines["django"].from_string(
+            "{% load viewlets %}"
+            "{% viewlet hello_prefetch o.items %}{% viewlet hello_prefetch o.items %}"
+        )
+        jinja_template = self.get_jinja_template(
+            "{% viewlet 'hello_prefetch', o.items() %}"
+            "{% viewlet 'hello_prefetch', o.items() %}"
+        )
+        for template in (django_template, jinja_template):
+            counter = Counter()
+            html = template.render({"o": counter})
+            self.assertEqual(html, "Hello 1!Hello 2!")
+            self.assertEqual(counter.count, 2)
+
+    def test_prefetch_tag_versions(self):
+        @viewlet(timeout=10, tags=lambda name: ["greetings", "name:%s" % name])
+        def hello_tagged(context, name):
+            return "Hello %s!" % name
+
+        get("hello_tagged").get_version()
+        template = engines["django"].from_string(
+            "{% load viewlets %}"
+            "{% viewlet hello_tagged 'a' %}{% viewlet hello_tagged 'b' %}"
+            "{% viewlet hello_tagged 'c' %}"
+        )
+        html = template.render()
+        # One get_many for the tag versions of all viewlets, one for their entries
+        self.assertEqual(self.assertRoundTrips(template.render, 0, 2), html)
+        with mock.patch.dict(viewlet_tags.settings, VIEWLET_PARALLEL_RENDER=True):
+            invalidate_tags("greetings")
+            self.assertEqual(self.assertRoundTrips(template.render, 0, 2), html)
+
+    def test_django_prefetch_conditional(self):
+        class User:
+            is_staff = False
+
+            def boom(self):
+                raise RuntimeError("boom")
+
+        template = engines["django"].from_string(
+            "{% load viewlets %}"
+            "{% viewlet hello_prefetch 'world' %}"
+            "{% viewlet hello_prefetch 'wörld' %}"
+            "{% if user.is_staff %}{% viewlet hello_prefetch user.boom %}{% endif %}"
+        )
+        html = self.assertRoundTrips(lambda: template.render({"user": User()}), 0, 1)
+        self.assertEqual(html, "Hello world!Hello wörld!")
+
+        # Errors resolving arguments are left to the node render
+        template = engines["django"].from_string(
+            "{% load viewlets %}"
+            "{% viewlet hello_prefetch 'world' %}{% viewlet hello_prefetch user.boom %}"
+        )
+        self.assertRaises(RuntimeError, template.render, {"user": User()})
+
+    def test_django_prefetch_blocks(self):
+        from django.template import engines as template_engines
+
+        loader = "django.template.loaders.locmem.Loader"
+        templates = {
+            "base.html": "{% load viewlets %}{% viewlet hello_prefetch 'base' %}"
+            "{% block a %}{% viewlet hello_prefetch 'a' %}{% endblock %}"
+            "{% block b %}{% viewlet hello_prefetch 'b' %}{% endblock %}",
+            "page.html": "{% extends 'base.html' %}{% load viewlets %}"
+            "{% block a %}{% viewlet hello_prefetch 'page' %}{% endblock %}",
+        }
+        engine = template_engines["django"].engine.__class__(
+            libraries={"viewlets": "viewlet.templatetags.viewlets"},
+            loaders=[(loader, templates)],
+        )
+        get_many = viewlet_tags.get_many
+        with mock.patch.object(viewlet_tags, "get_many", wraps=get_many) as fetch:
+            html = engine.get_template("page.html").render(Context())
+        self.assertEqual(html, "Hello base!Hello page!Hello b!")
+        calls = fetch.call_args[0][0]
+        self.assertEqual([args[1:] for v, args in calls], [["base"], ["page"], ["b"]])
+
+    def get_jinja_template(self, source):
+        from jinja2 import DictLoader, Environment
+
+        env = Environment(
+            loader=DictLoader({"page.html": source}),
+            extensions=[jinja2_loader.ViewletExtension],
+        )
+        return env.get_template("page.html")
+
+    def test_jinja_prefetch(self):
+        template = self.get_jinja_template(
+            "{% viewlet 'hello_prefetch', 'world' %}"
+            "{% viewlet 'hello_prefetch_context', name %}"
+            "{% for n in names %}{% viewlet 'hello_prefetch', n %}{% endfor %}"
+        )
+        context = {"name": "wörld", "names": ["a"]}
+        html1 = self.assertRoundTrips(lambda: template.render(context), 1, 1)
+        html2 = self.assertRoundTrips(lambda: template.render(context), 1, 1)
+        self.assertEqual(html1, html2)
+        self.assertEqual(html1, "Hello world!Hello wörld!\nHello a!")
+
+    def test_jinja_prefetch_bytecode_cache(self):
+        from jinja2 import DictLoader, Environment, FileSystemBytecodeCache
+
+        source = (
+            "{% viewlet 'hello_prefetch', 'world' %}"
+            "{% viewlet 'hello_prefetch_context', name %}"
+        )
+        with tempfile.TemporaryDirectory() as cache_dir:
+            envs = [
+                Environment(
+                    loader=DictLoader({"page.html": source}),
+                    extensions=[jinja2_loader.ViewletExtension],
+                    bytecode_cache=FileSystemBytecodeCache(cache_dir),
+                )
+                for i in range(2)
+            ]
+            html1 = envs[0].get_template("page.html").render(name="wörld")
+            template = envs[1].get_template("page.html")
+        extension = envs[1].extensions["viewlet.loaders.jinja2_loader.ViewletExtension"]
+        self.assertNotIn("page.html", extension._prefetch_calls)
+        html2 = self.assertRoundTrips(lambda: template.render(name="wörld"), 0, 1)
+        self.assertEqual(html2, html1)
+        self.assertEqual(html2, "Hello world!Hello wörld!\n")
+
+    def test_parallel_render(self):
+        threads = []
+
+        @viewlet(timeout=10)
+        def hello_slow(context, name):
+            threads.append(threading.current_thread().name)
+            sleep(0.1)
+            return "Hello %s!" % name
+
+        template = engines["django"].from_string(
+            "{% load viewlets %}"
+            "{% viewlet hello_slow 'world' %} {% viewlet hello_slow 'wörld' %}"
+        )
+        with mock.patch.dict(viewlet_tags.settings, VIEWLET_PARALLEL_RENDER=True):
+            start = time()
+            html = template.render()
+            self.assertLess(time() - start, 0.2)
+        self.assertEqual(html, "Hello world! Hello wörld!")
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith("viewlet-request") for name in threads))
+
+        template = self.get_jinja_template(
+            "{% viewlet 'hello_slow', 'a' %} {% viewlet 'hello_slow', 'b' %}"
+        )
+        with mock.patch.dict(jinja2_loader.settings, VIEWLET_PARALLEL_RENDER=True):
+            start = time()
+            html = template.render()
+            self.assertLess(time() - start, 0.2)
+        self.assertEqual(html, "Hello a! Hello b!")
+        self.assertEqual(len(threads), 4)
+
+    def test_compute_many_encodes_once(self):
+        calls = [("hello_prefetch", (name,), {}) for name in ("a", "b")]
+        compression.metrics.reset()
+        with mock.patch.dict(
+            models.settings, VIEWLET_COMPRESSOR="zlib", VIEWLET_COMPRESS_MIN_SIZE=0
+        ):
+            # Computed entries are also set when prefetched within another scope
+            with prefetch(("hello_prefetch", ("c",), {})):
+                html = api.call_many(calls)
+        self.assertEqual(html, ["Hello a!", "Hello b!"])
+        self.assertEqual(compression.metrics.stats()["compressed"], 2)
+
+    def test_parallel_render_certain(self):
+        computed = []
+
+        @viewlet(timeout=10)
+        def hello_certain(context, name):
+            computed.append(name)
+            return "Hello %s!" % name
+
+        template = engines["django"].from_string(
+            "{% load viewlets %}"
+            "{% viewlet hello_certain 'a' %}{% viewlet hello_certain 'b' %}"
+            "{% if hidden %}{% viewlet hello_certain 'c' %}{% endif %}"
+        )
+        with mock.patch.dict(viewlet_tags.settings, VIEWLET_PARALLEL_RENDER=True):
+            self.assertEqual(template.render(), "Hello a!Hello b!")
+        self.assertEqual(sorted(computed), ["a", "b"])
+
+        template = self.get_jinja_template(
+            "{% viewlet 'hello_certain', 'd' %}{% viewlet 'hello_certain', 'e' %}"
+            "{% if hidden %}{% viewlet 'hello_certain', 'f' %}{% endif %}"
+            "{% block body %}{% viewlet 'hello_certain', 'g' %}{% endblock %}"
+        )
+        compute_many = jinja2_loader.compute_many
+        with mock.patch.dict(jinja2_loader.settings, VIEWLET_PARALLEL_RENDER=True):
+            with mock.patch.object(
+                jinja2_loader, "get_many", wraps=get_many
+            ) as fetch, mock.patch.object(
+                jinja2_loader, "compute_many", wraps=compute_many
+            ) as compute:
+                html = template.render()
+        self.assertEqual(html, "Hello d!Hello e!Hello g!")
+        self.assertEqual(sorted(computed), ["a", "b", "d", "e", "g"])
+        # Blocks may be overridden, fetched but not computed ahead of render
+        fetched = [args[1:] for _, args in fetch.call_args[0][0]]
+        self.assertEqual(fetched, [["d"], ["e"], ["g"]])
+        computed_ahead = [args[1:] for _, args in compute.call_args[0][0]]
+        self.assertEqual(computed_ahead, [["d"], ["e"]])
+
+    def test_prefetch(self):
+        with prefetch(
+            ("hello_prefetch", ("world",), {}),
+            ("hello_prefetch_context", (), {"name": "world"}),
+        ):
+            v = get("hello_prefetch")
+            html = self.assertRoundTrips(lambda: v.call({}, "world"), 0, 0)
+            self.assertEqual(html, "Hello world!")
+            v.expire("world")
+            self.assertIsNone(v._cache_get(v._build_cache_key("world")))
+
+    def test_memoize(self):
+        v = get("hello_prefetch")
+
+        def render():
+            return [v.call({}, "world") for i in range(3)]
+
+        with cache_m.memoize():
+            self.assertRoundTrips(render, 1, 0)
+            self.assertRoundTrips(render, 0, 0)
+            v.expire("world")
+            self.assertRoundTrips(render, 1, 0)
+            self.assertRoundTrips(
+                lambda: get_many([(v, v._build_args({}, "world"))]), 0, 0
+            )
+        self.assertRoundTrips(render, 3, 0)
+
+    def test_memo_middleware(self):
+        v = get("hello_prefetch")
+        middleware = ViewletMemoMiddleware(lambda request: render())
+
+        def render():
+            return [v.call({}, "world") for i in range(3)]
+
+        self.assertRoundTrips(lambda: middleware(None), 1, 0)
+        self.assertIsNone(cache_m._memo.get())
+
+
+class ViewletLocalCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_m.local_cache.clear()
+
+        @viewlet(timeout=10, local_timeout=5)
+        def hello_local(context, name):
+            return "Hello %s! [%s]" % (name, time())
+
+    def test_lru(self):
+        local_cache = cache_m.LocalCache(max_entries=2, max_bytes=10)
+        local_cache.set("a", b"aaa", 10, None)
+        local_cache.set("b", b"bbb", 10, None)
+        self.assertEqual(local_cache.get("a", None), b"aaa")
+        local_cache.set("c", b"ccc", 10, None)
+        self.assertIs(local_cache.get("b", None), MISSING)
+        local_cache.set("d", b"dddddd", 10, None)
+        self.assertIs(local_cache.get("a", None), MISSING)
+        self.assertIs(local_cache.get("d", None), b"dddddd")
+        local_cache.set("e", b"e" * 11, 10, None)
+        self.assertIs(local_cache.get("e", None), MISSING)
+        local_cache.set("f", b"fff", 0, None)
+        self.assertIs(local_cache.get("f", None), MISSING)
+        self.assertIs(local_cache.get("d", 1), MISSING)
+        self.assertEqual(
+            local_cache.stats(), {"hits": 2, "misses": 5, "entries": 0, "bytes": 0}
+        )
+
+    def test_lru_context_size(self):
+        local_cache = cache_m.LocalCache(max_entries=10, max_bytes=1000)
+        context = {"items": [str(i) * 100 for i in range(20)]}
+        self.assertGreater(cache_m.sizeof(context), 2000)
+        local_cache.set("a", context, 10, None)
+        self.assertIs(local_cache.get("a", None), MISSING)
+        local_cache.set("b", {"name": "wörld"}, 10, None)
+        self.assertEqual(local_cache.get("b", None), {"name": "wörld"})
+
+    def test_local_cache(self):
+        v = get("hello_local")
+        backend = caches["default"]
+        html1 = v.call({}, "world")
+        with mock.patch.object(backend, "get", wraps=backend.get) as backend_get:
+            self.assertEqual(v.call({}, "world"), html1)
+        self.assertFalse(backend_get.called)
+        self.assertEqual(cache_m.local_cache.hits, 1)
+
+    def test_local_cache_generation(self):
+        v = get("hello_local")
+        html1 = v.call({}, "world")
+
+        # Refreshed by another process
+        cache.set(v._build_cache_key("world"), b"Hello other!")
+        cache.set(v._build_generation_key(), "other")
+        self.assertEqual(v.call({}, "world"), html1)
+        v._generation = (0, v._generation[1])  # Generation check interval passed
+        self.assertEqual(v.call({}, "world"), "Hello other!")
+
+        v.expire("world")
+        self.assertNotEqual(v.call({}, "world"), "Hello other!")
+
+
+@skipIf(django.VERSION < (4, 0), "Async cache API requires Django 4.0+")
+class ViewletAsyncTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        @viewlet(timeout=10)
+        async def hello_async(context, name):
+            await asyncio.sleep(0)
+            return "Hello %s! [%s]" % (name, time())
+
+        @viewlet(template="hello_world.html", timeout=10)
+        def hello_async_context(context, name):
+            return {"name": name}
+
+        @viewlet(timeout=10, lock=True)
+        async def hello_async_locked(context, name):
+            return "Hello %s!" % name
+
+        @viewlet(timeout=10, tags=lambda name: ["name:%s" % name])
+        async def hello_async_tagged(context, name):
+            return "Hello %s!" % name
+
+    async def test_acall(self):
+        html1, html2, html3 = await asyncio.gather(
+            acall("hello_async", None, "world"),
+            acall("hello_async_context", {"extra": "Räksmörgås "}, "wörld"),
+            acall("hello_async_locked", None, "world"),
+        )
+        self.assertTrue(html1.startswith("Hello world!"))
+        self.assertEqual(html2, "Räksmörgås Hello wörld!\n")
+        self.assertEqual(html3, "Hello world!")
+        self.assertEqual(await acall("hello_async", None, "world"), html1)
+        v = get("hello_async_locked")
+        self.assertIsNone(
+            await cache.aget(v._build_lock_key(v._build_cache_key("world")))
+        )
+
+    async def test_aprefetch(self):
+        html = await acall("hello_async", None, "world")
+        with await aprefetch(("hello_async", ("world",), {})) as entries:
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(await acall("hello_async", None, "world"), html)
+
+    async def test_acall_versions(self):
+        # Sync cache calls of async ones run in another thread, off the event loop
+        loop_thread = threading.current_thread()
+        blocking = []
+
+        def record(method):
+            def wrapper(*args, **kwargs):
+                if threading.current_thread() is loop_thread:
+                    blocking.append(method.__name__)
+                return method(*args, **kwargs)
+
+            return wrapper
+
+        v = get("hello_async_tagged")
+        v._version = (0, None)
+        with mock.patch.multiple(
+            cache,
+            get=record(cache.get),
+            get_many=record(cache.get_many),
+            add=record(cache.add),
+        ):
+            html = await acall("hello_async_tagged", None, "world")
+            v._version = (0, None)
+            with await aprefetch(("hello_async_tagged", ("world",), {})) as entries:
+                self.assertEqual(len(entries), 2)
+                self.assertEqual(await acall("hello_async_tagged", None, "world"), html)
+        self.assertEqual(blocking, [])
+
+    def test_call_async_viewlet(self):
+        html = call("hello_async", None, "world")
+        self.assertTrue(html.startswith("Hello world!"))
+        self.assertEqual(
+            models.async_to_sync(acall)("hello_async", None, "world"), html
+        )
+
+    async def test_async_memo_middleware(self):
+        async def get_response(request):
+            return cache_m._memo.get()
+
+        middleware = ViewletMemoMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(await middleware(None), {})
+
+
 class ViewletCacheBackendTest(TestCase):
     @override_settings(VIEWLET_DEFAULT_CACHE_ALIAS="dummy")
     @override_settings(
@@ -414,7 +1496,7 @@ class ViewletKeyTest(TestCase):
 
     def test_custom_key_without_args(self):
         v = get("custom_key_without_args")
-        self.assertEqual(v._build_cache_key(), "somekey")
+        self.assertEqual(v._build_cache_key(), "somekey:%s" % v.get_version())
 
     def test_custom_key_missing_args(self):
         v = get("custom_key_missing_args")
@@ -434,6 +1516,50 @@ class ViewletKeyTest(TestCase):
         args = ("Hello", "world")
         self.assertRaises(exceptions.DeprecatedKeyFormat, v._build_cache_key, *args)
 
+    def test_custom_key_format_validated_on_register(self):
+        self.assertEqual(get("custom_key_with_args").key_format, "somekey:{args}")
+        self.assertIsNone(get("custom_key_missing_args").key_format)
+
+    def test_key_args_hash(self):
+        v = get("custom_key_with_args")
+        key = make_key_args_hash(v, ("Hello", "world"))
+        self.assertRegex(key, r"^somekey:[0-9a-f]{16}$")
+        self.assertNotEqual(key, make_key_args_hash(v, ("Hello", "there")))
+
+    def test_key_lru(self):
+        v = get("custom_key_with_args")
+        v._cached_make_key.cache_clear()
+        key = v._build_cache_key("Hello", "world")
+        self.assertEqual(v._build_cache_key("Hello", "world"), key)
+        self.assertEqual(v._cached_make_key.cache_info().hits, 1)
+        # Arguments of other types may change representation, never memoized
+        v._build_cache_key(["Hello"], "world")
+        self.assertEqual(v._cached_make_key.cache_info().currsize, 1)
+
+    def test_key_lru_typed(self):
+        v = get("custom_key_with_args")
+        v._cached_make_key.cache_clear()
+        keys = [v._build_cache_key(arg, "world") for arg in (1, True, 1.0)]
+        self.assertEqual(
+            [key.rsplit(":", 1)[0] for key in keys],
+            [v._make_key((arg, "world")) for arg in (1, True, 1.0)],
+        )
+        self.assertEqual(len(set(keys)), 3)
+        self.assertEqual(v._cached_make_key.cache_info().currsize, 3)
+
+    def test_key_lru_custom_key_function(self):
+        @viewlet(timeout=10, key=lambda v, args: "menu:%s" % get_language())
+        def language_menu(context):
+            return get_language()
+
+        v = get("language_menu")
+        self.assertIsNone(v._cached_make_key)
+        with translation.override("sv"):
+            self.assertEqual(v.call({}), "sv")
+        with translation.override("de"):
+            self.assertTrue(v._build_cache_key().startswith("menu:de:"))
+            self.assertEqual(v.call({}), "de")
+
     def test_key_args_join(self):
         self.key_func = "viewlet.cache.make_key_args_join"
         django.conf.settings.VIEWLET_CACHE_KEY_FUNCTION = self.key_func
@@ -455,7 +1581,9 @@ class ViewletKeyTest(TestCase):
         args = ("Hello", "world")
         v.call({}, *args)
         cache_key = v._build_cache_key(*args)
-        self.assertEqual(cache_key, make_key_args_join(v, args))
+        self.assertEqual(
+            cache_key, "%s:%s" % (make_key_args_join(v, args), v.get_version())
+        )
         self.assertEqual(v._cache_get(cache_key), "%s %s!" % args)
 
         del django.conf.settings.VIEWLET_CACHE_KEY_FUNCTION
@@ -2,4 +2,7 @@ from django.urls import re_path
 
 from . import views
 
-urlpatterns = [re_path(r"^(?P<name>.+)/$", views.viewlet_view, name="viewlet")]
+urlpatterns = [
+    re_path(r"^_batch/$", views.viewlet_batch_view, name="viewlet_batch"),
+    re_path(r"^(?P<name>.+)/$", views.viewlet_view, name="viewlet"),
+]
@@ -1,7 +1,35 @@
-from django.http import HttpResponse
+import hashlib
+import json
+from concurrent.futures import as_completed
+
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.encoding import smart_bytes
+from django.utils.http import quote_etag
 
 import viewlet
 
+from .cache import memoize, prefetched
+from .conf import settings
+from .exceptions import UnknownViewlet
+from .executor import in_worker, submit
+
+PLACEHOLDER = '<div id="viewlet-%s"></div>'
+
+SWAP_FRAGMENT = (
+    '<template id="viewlet-%(id)s-fragment">%(html)s</template>'
+    "<script>(function(){"
+    'var t=document.getElementById("viewlet-%(id)s-fragment");'
+    'document.getElementById("viewlet-%(id)s").replaceWith(t.content);'
+    "t.remove();"
+    "})();</script>"
+)
+
 
 def viewlet_view(request, name):
     context = {"request": request}
@@ -10,7 +38,165 @@ def viewlet_view(request, name):
     # This feels klunky, is there a better way to do it?
     kwargs.update({k: ",".join(request.GET.getlist(k)) for k in request.GET})
 
-    output = viewlet.call(name, context, **kwargs)
+    v = viewlet.get(name)
+    with memoize():
+        # Answer conditional requests from the cached fragment without rendering
+        output, misses = get_cached_output(v, context, **kwargs)
+        if output is not None:
+            etag = make_etag(output)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified["ETag"] = etag
+                patch_viewlet_cache_headers(not_modified, v)
+                return not_modified
+        else:
+            # Misses are not memoized, hand the one fetched over to the call
+            with prefetched(misses):
+                output = v.call(context, **kwargs)
+
     resp = HttpResponse(output)
     resp["X-Robots-Tag"] = "noindex"
+    resp["ETag"] = make_etag(output)
+    patch_viewlet_cache_headers(resp, v)
+    return get_conditional_response(request, etag=resp["ETag"], response=resp)
+
+
+def get_cached_output(v, context, **kwargs):
+    """
+    Returns the cached fragment of a viewlet caching its output as is,
+    unless missing or stale, and the entry fetched if missing, to prefetch.
+    """
+    if not v.is_using_cache() or (v.template and not v.is_caching_rendered()):
+        return None, {}
+    kwargs.pop("request", None)
+    merged_args = v._build_args(context, **kwargs)
+    cache_key = v._build_cache_key(*merged_args[1:])
+    output, stale = v._cache_get_entry(cache_key)
+    if output is None:
+        return None, {cache_key: None}
+    return None if stale else output, {}
+
+
+def make_etag(output):
+    return quote_etag(hashlib.sha1(smart_bytes(output)).hexdigest())
+
+
+def patch_viewlet_cache_headers(response, v):
+    """
+    Sets Cache-Control max-age from the viewlet timeout, or soft timeout, when allowed
+    by VIEWLET_HTTP_MAX_AGE. Otherwise responses, which may depend on the user, are
+    private and revalidated with their ETag.
+    """
+    if not v.is_using_cache():
+        patch_cache_control(response, no_cache=True)
+        return
+
+    if settings.VIEWLET_HTTP_MAX_AGE is None:
+        patch_cache_control(response, private=True, no_cache=True)
+        return
+
+    max_age = v.timeout if v.soft_timeout is None else v.soft_timeout
+    if max_age is None:
+        max_age = settings.VIEWLET_INFINITE_CACHE_TIMEOUT
+    max_age = min(max_age, settings.VIEWLET_HTTP_MAX_AGE)
+    patch_cache_control(response, max_age=int(max_age))
+
+
+def viewlet_batch_view(request):
+    """
+    Renders many viewlets in one request. Takes a JSON list of
+    {"name": ..., "args": [...], "kwargs": {...}} viewlet calls, as POST body
+    or "viewlets" querystring, and responds with a JSON list of fragments.
+    """
+    if request.method == "POST":
+        data = request.body
+    else:
+        data = request.GET.get("viewlets", "")
+
+    try:
+        calls = [
+            (call["name"], list(call.get("args", [])), dict(call.get("kwargs", {})))
+            for call in json.loads(data)
+        ]
+        viewlets = [viewlet.get(name) for name, _, _ in calls]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return HttpResponseBadRequest("Malformed viewlet calls")
+    except UnknownViewlet as e:
+        return HttpResponseBadRequest(str(e))
+
+    if len(calls) > settings.VIEWLET_BATCH_MAX_CALLS:
+        return HttpResponseBadRequest(
+            "At most %d viewlet calls allowed, %d given"
+            % (settings.VIEWLET_BATCH_MAX_CALLS, len(calls))
+        )
+
+    for v, (_, args, _) in zip(viewlets, calls):
+        if len(args) >= len(v.viewlet_func_args):
+            return HttpResponseBadRequest(
+                "Viewlet %s takes %d arguments, %d given"
+                % (v.name, len(v.viewlet_func_args) - 1, len(args))
+            )
+
+    fragments = viewlet.call_many(calls, {"request": request}, request=request)
+    resp = JsonResponse({"fragments": fragments})
+    resp["X-Robots-Tag"] = "noindex"
     return resp
+
+
+class StreamingViewletResponse(StreamingHttpResponse):
+    """
+    Streams a page shell first, then each viewlet fragment as soon as it is ready.
+    Viewlets, given as (name, args, kwargs) calls, are computed concurrently in the worker pool.
+
+    In order, fragments follow the shell one by one. Out of order, the shell should contain
+    a placeholder(index) for each call, swapped with its fragment by an inline script.
+    """
+
+    def __init__(
+        self,
+        calls,
+        context=None,
+        request=None,
+        shell="",
+        tail="",
+        ordered=True,
+        **kwargs
+    ):
+        self.calls = calls
+        self.context = context or {"request": request}
+        self.request = request
+        self.ordered = ordered
+        content = self.stream(shell, tail)
+        super().__init__(content, **kwargs)
+
+    @staticmethod
+    def placeholder(index):
+        return PLACEHOLDER % index
+
+    def call(self, name, args, kwargs):
+        # Viewlets computed concurrently get a context copy of their own
+        return viewlet.call(
+            name, dict(self.context), *args, request=self.request, **kwargs
+        )
+
+    def stream(self, shell, tail):
+        yield shell
+        for index, html in self.fragments():
+            yield html if self.ordered else self.swap(index, html)
+        yield tail
+
+    def fragments(self):
+        """
+        Yields (index, html) of rendered calls, in completion order unless ordered.
+        """
+        if in_worker():
+            yield from enumerate(self.call(*call) for call in self.calls)
+            return
+
+        futures = [submit(self.call, *call) for call in self.calls]
+        indexes = {future: index for index, future in enumerate(futures)}
+        for future in futures if self.ordered else as_completed(futures):
+            yield indexes[future], future.result()
+
+    def swap(self, index, html):
+        return SWAP_FRAGMENT % {"id": index, "html": html}